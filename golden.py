@@ -0,0 +1,243 @@
+"""
+Golden-trajectory differential tests for the simulators.
+
+Stores compressed reference trajectories (positions and speeds every 1 s
+over a 300 s horizon) for the v1 and v2 setups and the four v3 experiments,
+and checks a simulation engine against them:
+
+    python golden.py record [--cases v3_exp1 ...]
+    python golden.py check  [--engine reference|decomposed] [--cases ...] [--atol 1e-9] [--rtol 0]
+
+Each case runs in its own Python process (the versions share module names)
+with the version's default seed, so every engine sees the same random
+stream. check reports the first divergence per case (vehicle, field and the
+steps since the last stored sample, where it must have started, as samples
+are 1 s apart) and exits with status 1 if any case diverges or fails to run. A case the
+engine does not implement (v1/v2 with the decomposed engine) is skipped.
+"""
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(ROOT, "golden")
+
+HORIZON = 300           # Simulated time (s)
+SAMPLE_INTERVAL = 1.0   # Time between stored samples (s)
+FIELDS = ("position", "speed")
+
+# Case name: (version directory, v3 experiment)
+CASES = {
+    "v1":      ("v1", None),
+    "v2":      ("v2", None),
+    "v3_exp1": ("v3", 1),
+    "v3_exp2": ("v3", 2),
+    "v3_exp3": ("v3", 3),
+    "v3_exp4": ("v3", 4),
+}
+ENGINES = ("reference", "decomposed")
+
+UNSUPPORTED_STATUS = 3   # Exit status of a capture process for a case the engine does not implement
+
+
+class UnsupportedCase(Exception):
+    pass
+
+
+# ===== Capture (runs inside the case's process) =====
+def _simulator(case, engine):
+    directory, experiment = CASES[case]
+    sys.path.insert(0, os.path.join(ROOT, directory))
+    from config import Config
+    from simulator import Simulator
+
+    if directory != "v3":
+        if engine != "reference":
+            raise UnsupportedCase(f"{case}: only the reference engine exists")
+        config = Config()
+        config.time_max = 1 + HORIZON
+        return Simulator(config), config
+
+    config = Config(experiment=experiment, time_max=1 + HORIZON)
+    if engine == "decomposed":
+        from decomposition import DecomposedSimulator
+        return DecomposedSimulator(config, verbose=False), config
+    return Simulator(config, verbose=False), config
+
+
+def capture(case, engine, path):
+    """Run one case and save its sampled trajectories as a compressed .npz file."""
+    sim, config = _simulator(case, engine)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim.run()
+
+    dt = config.simulation_time_step
+    stride = max(1, int(round(SAMPLE_INTERVAL / dt)))
+
+    vehicle, sample, columns = [], [], {name: [] for name in FIELDS}
+    for v in sim.vehicles:
+        for record in v.history:
+            step = int(round((record["t"] - 1) / dt))
+            if step % stride:
+                continue
+            vehicle.append(v.id)
+            sample.append(step // stride)
+            for name in FIELDS:
+                columns[name].append(record[name])
+
+    np.savez_compressed(path, vehicle=np.array(vehicle, dtype=np.int64), sample=np.array(sample, dtype=np.int64),
+                        stride=stride, dt=dt, **{name: np.array(values, dtype=float) for name, values in columns.items()})
+
+
+def run_cases(cases, engine, directory):
+    """Capture cases in parallel processes; returns {case: (status, path or message)}, status "ok", "unsupported" or "error"."""
+    processes = {}
+    for case in cases:
+        path = os.path.join(directory, f"{case}.npz")
+        command = [sys.executable, os.path.abspath(__file__), "_capture", case, engine, path]
+        processes[case] = (path, subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE))
+
+    results = {}
+    for case, (path, process) in processes.items():
+        _, error = process.communicate()
+        if process.returncode == 0:
+            results[case] = ("ok", path)
+            continue
+        lines = error.decode().strip().splitlines()
+        message = lines[-1] if lines else f"exit status {process.returncode}"
+        results[case] = ("unsupported" if process.returncode == UNSUPPORTED_STATUS else "error", message)
+    return results
+
+
+# ===== Comparison =====
+def first_divergence(golden, candidate, atol=1e-9, rtol=0.0):
+    """
+    First (sample, vehicle) where candidate differs from golden, or None.
+
+    Rows are matched on (vehicle, sample); a row missing on either side is a
+    divergence in field "presence". All earlier samples match, so the
+    divergence started within "steps" (first, last): after the previous
+    sample's step, up to this sample's; "times" are the same bounds in s.
+    """
+    def keys(data):
+        return data["vehicle"] * (1 << 32) + data["sample"]
+
+    golden_keys, candidate_keys = keys(golden), keys(candidate)
+    order = np.argsort(candidate_keys, kind="stable")
+    sorted_keys = candidate_keys[order]
+
+    if len(sorted_keys):
+        index = np.minimum(np.searchsorted(sorted_keys, golden_keys), len(sorted_keys) - 1)
+        found = sorted_keys[index] == golden_keys
+        rows = order[index]
+    else:
+        found = np.zeros(len(golden_keys), bool)
+        rows = np.zeros(len(golden_keys), dtype=np.int64)
+
+    # (sample, vehicle, field, golden value, candidate value) of each field's first violation
+    violations = []
+    missing = ~found
+    if missing.any():
+        k = np.lexsort((golden["vehicle"][missing], golden["sample"][missing]))[0]
+        violations.append((golden["sample"][missing][k], golden["vehicle"][missing][k], "presence", "row", "missing"))
+
+    extra = ~np.isin(candidate_keys, golden_keys)
+    if extra.any():
+        k = np.lexsort((candidate["vehicle"][extra], candidate["sample"][extra]))[0]
+        violations.append((candidate["sample"][extra][k], candidate["vehicle"][extra][k], "presence", "missing", "row"))
+
+    for name in FIELDS:
+        expected = golden[name][found]
+        actual = candidate[name][rows[found]]
+        bad = ~(np.abs(actual - expected) <= atol + rtol * np.abs(expected))
+        if bad.any():
+            k = np.lexsort((golden["vehicle"][found][bad], golden["sample"][found][bad]))[0]
+            violations.append((golden["sample"][found][bad][k], golden["vehicle"][found][bad][k], name,
+                               expected[bad][k], actual[bad][k]))
+
+    if not violations:
+        return None
+
+    sample, vehicle, field, expected, actual = min(violations, key=lambda v: (v[0], v[1]))
+    stride, dt = int(golden["stride"]), float(golden["dt"])
+    last = int(sample) * stride
+    first = max(last - stride + 1, 0)
+    return {"vehicle": int(vehicle), "steps": (first, last), "times": (1 + first * dt, 1 + last * dt),
+            "field": field, "golden": expected, "candidate": actual}
+
+
+# ===== Commands =====
+def command_record(args):
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    failed = False
+    for case, (status, result) in run_cases(args.cases, "reference", GOLDEN_DIR).items():
+        failed |= status != "ok"
+        print(f"{case:<8} {'recorded' if status == 'ok' else 'FAILED: ' + result}")
+    return 1 if failed else 0
+
+
+def command_check(args):
+    failed = False
+    with tempfile.TemporaryDirectory(prefix="golden_") as directory:
+        for case, (status, result) in run_cases(args.cases, args.engine, directory).items():
+            if status == "unsupported":
+                print(f"{case:<8} skipped: {result}")
+                continue
+            if status == "error":
+                failed = True
+                print(f"{case:<8} FAILED: {result}")
+                continue
+
+            with np.load(os.path.join(GOLDEN_DIR, f"{case}.npz")) as golden, np.load(result) as candidate:
+                divergence = first_divergence(dict(golden), dict(candidate), args.atol, args.rtol)
+
+            if divergence is None:
+                print(f"{case:<8} ok")
+            else:
+                failed = True
+                d = divergence
+                print(f"{case:<8} DIVERGED within steps {d['steps'][0]}-{d['steps'][1]} "
+                      f"(t={d['times'][0]:.1f}-{d['times'][1]:.1f} s), vehicle {d['vehicle']}, "
+                      f"{d['field']}: golden {d['golden']}, got {d['candidate']}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "_capture":
+        try:
+            capture(*argv[1:4])
+        except UnsupportedCase as error:
+            print(error, file=sys.stderr)
+            return UNSUPPORTED_STATUS
+        return 0
+
+    parser = argparse.ArgumentParser(description="Golden-trajectory differential tests")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="record golden trajectories with the reference engine")
+    record.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    record.set_defaults(handler=command_record)
+
+    check = commands.add_parser("check", help="compare an engine against the golden trajectories")
+    check.add_argument("--engine", choices=ENGINES, default="reference")
+    check.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    check.add_argument("--atol", type=float, default=1e-9, help="absolute tolerance")
+    check.add_argument("--rtol", type=float, default=0.0, help="relative tolerance")
+    check.set_defaults(handler=command_check)
+
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    status = args.handler(args)
+    print(f"({time.perf_counter() - start:.1f} s)")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Per-vehicle travel time accounting for Simulator.run.
+
+Vehicles stay in entry order on the single lane, so the vehicles still on
+the road are always the suffix vehicles[first:] of the simulator's list.
+Each step only that suffix is visited (stop time and stop count), and
+vehicles crossing road_length are finalized as they leave: entry and exit
+time, travel time, delay against free flow at speed_limit, time below
+stop_speed and number of stops. Exit times within the last step are
+interpolated from the overshoot. Outflow at the road end is kept as a
+rolling count over outflow_window.
+"""
+from collections import deque
+
+TRAVEL_FIELDS = ("id", "entry_time", "exit_time", "travel_time", "delay", "stop_time", "stops")
+
+
+class TravelTimeAccount:
+
+    def __init__(self, config):
+        self.road_length = config.road_length
+        self.dt = config.simulation_time_step
+        self.free_flow_time = config.road_length / config.speed_limit
+        self.stop_speed = config.stop_speed
+        self.outflow_window = config.outflow_window
+
+        # Running state of vehicles on the road, indexed by position in the vehicle list
+        self.first = 0
+        self.entry_time = []
+        self.stop_time = []
+        self.stops = []
+        self.stopped = []
+
+        # Finalized vehicles (one row per exited vehicle) and recent exit times
+        self.records = {name: [] for name in TRAVEL_FIELDS}
+        self.recent_exits = deque()
+
+
+    def update(self, vehicles, t):
+        """Account for one step; call after positions and speeds are updated."""
+        # New vehicles entered in this step: placed at the road start at t - dt, then advanced to t
+        for _ in range(len(self.entry_time), len(vehicles)):
+            self.entry_time.append(t - self.dt)
+            self.stop_time.append(0.0)
+            self.stops.append(0)
+            self.stopped.append(False)
+
+        # Vehicles leaving the road (the head of the on-road suffix first)
+        while self.first < len(vehicles) and vehicles[self.first].position >= self.road_length:
+            self._finalize(vehicles[self.first], self.first, t)
+            self.first += 1
+
+        # Stops of the vehicles still on the road
+        stop_speed = self.stop_speed
+        dt = self.dt
+        stop_time, stops, stopped = self.stop_time, self.stops, self.stopped
+        for k in range(self.first, len(vehicles)):
+            if vehicles[k].speed < stop_speed:
+                stop_time[k] += dt
+                if not stopped[k]:
+                    stops[k] += 1
+                    stopped[k] = True
+            else:
+                stopped[k] = False
+
+        # Rolling outflow window
+        recent = self.recent_exits
+        while recent and recent[0] <= t - self.outflow_window:
+            recent.popleft()
+
+
+    def _finalize(self, vehicle, k, t):
+        # Exit within the last step, from the overshoot at the current speed
+        overshoot = vehicle.position - self.road_length
+        exit_time = t - min(overshoot / vehicle.speed, self.dt) if vehicle.speed > 0 else t
+        travel_time = exit_time - self.entry_time[k]
+
+        row = (vehicle.id, self.entry_time[k], exit_time, travel_time,
+               travel_time - self.free_flow_time, self.stop_time[k], self.stops[k])
+        for name, value in zip(TRAVEL_FIELDS, row):
+            self.records[name].append(value)
+        self.recent_exits.append(exit_time)
+
+
+    @property
+    def exited(self):
+        return len(self.records["id"])
+
+
+    def outflow(self, t=None):
+        """Rolling outflow at the road end (veh/h) over the last outflow_window seconds."""
+        if t is not None and t - 1 < self.outflow_window:
+            return len(self.recent_exits) / max(t - 1, self.dt) * 3600
+        return len(self.recent_exits) / self.outflow_window * 3600
+
+
+    def summary(self):
+        """Means over exited vehicles (NaN if none exited)."""
+        n = self.exited
+        summary = {"exited": n}
+        for name in ("travel_time", "delay", "stop_time", "stops"):
+            summary[f"mean_{name}"] = sum(self.records[name]) / n if n else float("nan")
+        return summary
+
+
+    def table(self):
+        """Records of exited vehicles as NumPy arrays, one per field."""
+        import numpy as np
+        return {name: np.array(values) for name, values in self.records.items()}
@@ -0,0 +1,223 @@
+"""
+Animation export: vehicles moving along the road, colored by speed.
+
+- Frames are selected from the columnar trajectories with NumPy: every row on
+  a frame step is grouped by frame (CSR offsets), so no per-vehicle Python
+  work is done per frame.
+- One figure with a single scatter artist is reused. The static parts (axes,
+  ticks, colorbar) are drawn once and cached; per frame only the scatter, the
+  clock and (while active) the bottleneck zone are blitted onto that background.
+- Raw frame buffers are piped to ffmpeg (.mp4 and other video formats) or
+  collected by Pillow (.gif). With processes > 1, contiguous frame chunks are
+  rendered in parallel to temporary files and concatenated afterwards.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+
+
+def _ffmpeg():
+    """ffmpeg executable configured for matplotlib (animation.ffmpeg_path)."""
+    import matplotlib
+    return matplotlib.rcParams["animation.ffmpeg_path"]
+
+
+def writer_available(path):
+    """Whether the output format of path can be written (.gif always; video formats need ffmpeg)."""
+    if path.endswith(".gif"):
+        return True
+    from matplotlib import animation
+    return animation.writers.is_available("ffmpeg")
+
+
+def frame_arrays(trajectories, frame_interval=1.0):
+    """
+    Per-frame vehicle positions and speeds.
+
+    Returns (frame_times, offsets, positions, speeds): the vehicles of frame k
+    are rows offsets[k]:offsets[k + 1]. Vehicles beyond the road end are dropped.
+    """
+    metadata = trajectories.metadata
+    dt = metadata["simulation_time_step"]
+    columns = trajectories.columns
+    t = columns["t"]
+
+    t0 = t.min()
+    steps = np.rint((t - t0) / dt).astype(np.int64)
+    stride = max(1, int(round(frame_interval / dt)))
+
+    selected = (steps % stride == 0) & (columns["position"] <= metadata["road_length"])
+    frames = steps[selected] // stride
+    order = np.argsort(frames, kind="stable")
+
+    num_frames = int(steps.max() // stride) + 1
+    offsets = np.zeros(num_frames + 1, dtype=np.int64)
+    np.cumsum(np.bincount(frames, minlength=num_frames), out=offsets[1:])
+
+    frame_times = t0 + np.arange(num_frames) * stride * dt
+    positions = columns["position"][selected][order].astype(np.float32)
+    speeds = columns["speed"][selected][order].astype(np.float32)
+    return frame_times, offsets, positions, speeds
+
+
+class _FrameWriter:
+    """Encode raw RGBA frames: Pillow for .gif, piped to an ffmpeg process otherwise."""
+
+    def __init__(self, path, size, fps):
+        self.path = path
+        self.fps = fps
+        self.images = []
+        self.process = None
+
+        if not path.endswith(".gif"):
+            width, height = size
+            self.process = subprocess.Popen(
+                [_ffmpeg(), "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgba",
+                 "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                 "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p", path],
+                stdin=subprocess.PIPE,
+            )
+
+
+    def write(self, rgba):
+        if self.process is not None:
+            self.process.stdin.write(rgba.tobytes())
+        else:
+            from PIL import Image
+            self.images.append(Image.fromarray(rgba[..., :3]).quantize(colors=64, dither=Image.Dither.NONE))
+
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait() != 0:
+                raise RuntimeError(f"ffmpeg failed writing {self.path}")
+        elif self.images:
+            self.images[0].save(self.path, save_all=True, append_images=self.images[1:],
+                                duration=round(1000 / self.fps), loop=0)
+            self.images = []
+
+
+def render_frames(path, metadata, frame_times, offsets, positions, speeds, fps=20, dpi=100):
+    """Render frames (CSR arrays as returned by frame_arrays) into one file."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    road_length = metadata["road_length"]
+    cmap = plt.get_cmap("jet_r")
+    norm = plt.Normalize(vmin=0, vmax=metadata["speed_limit"])
+
+    fig, ax = plt.subplots(figsize=(10, 1.8), dpi=dpi)
+    ax.set_xlim(0, road_length)
+    ax.set_ylim(-1, 1)
+    ax.set_yticks([])
+    ax.set_xlabel("Position (m)")
+    ax.axhline(0, color="0.85", linewidth=12, zorder=0)
+
+    # Animated artists are left out of the cached background and drawn per frame
+    bottleneck = ax.axvspan(metadata["bottleneck_x_start"], metadata["bottleneck_x_end"],
+                            color="k", alpha=0.15, zorder=1, animated=True)
+    clock = ax.text(0.01, 0.85, "", transform=ax.transAxes, fontsize=9, animated=True)
+    scatter = ax.scatter([], [], s=18, marker="s", zorder=2, animated=True)
+
+    mappable = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+    fig.colorbar(mappable, ax=ax, label="Speed (m/s)", pad=0.01)
+    fig.tight_layout()
+
+    canvas = fig.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    writer = _FrameWriter(path, canvas.get_width_height(), fps)
+
+    try:
+        for k, t in enumerate(frame_times):
+            start, end = offsets[k], offsets[k + 1]
+            x = positions[start:end]
+            scatter.set_offsets(np.column_stack([x, np.zeros_like(x)]))
+            scatter.set_facecolors(cmap(norm(speeds[start:end])))
+            clock.set_text(f"t = {t:.0f} s")
+
+            canvas.restore_region(background)
+            if metadata["bottleneck_t_start"] <= t <= metadata["bottleneck_t_end"]:
+                ax.draw_artist(bottleneck)
+            ax.draw_artist(scatter)
+            ax.draw_artist(clock)
+            writer.write(np.asarray(canvas.buffer_rgba()))
+    finally:
+        writer.close()
+        plt.close(fig)
+
+
+def _render_chunk(args):
+    render_frames(*args)
+    return args[0]
+
+
+def _concatenate(parts, path):
+    """Concatenate chunk files into one output file."""
+    if path.endswith(".gif"):
+        from PIL import Image
+
+        images = []
+        durations = []
+        for part in parts:
+            with Image.open(part) as gif:
+                for index in range(gif.n_frames):
+                    gif.seek(index)
+                    images.append(gif.copy())
+                    durations.append(gif.info.get("duration", 50))
+        images[0].save(path, save_all=True, append_images=images[1:], duration=durations, loop=0)
+    else:
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as listing:
+            listing.writelines(f"file '{os.path.abspath(part)}'\n" for part in parts)
+        try:
+            subprocess.run([_ffmpeg(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                            "-i", listing.name, "-c", "copy", path], check=True)
+        finally:
+            os.remove(listing.name)
+
+
+def export_animation(trajectories, path, frame_interval=1.0, fps=20, dpi=100, processes=1):
+    """
+    Write an animation of trajectories to path (.mp4 or .gif).
+
+    frame_interval is the simulated time between frames (s); processes > 1
+    renders contiguous chunks of frames in parallel. Raises RuntimeError
+    before rendering if a video format is requested without ffmpeg.
+    """
+    if not writer_available(path):
+        raise RuntimeError("ffmpeg is required for video output; use a .gif path instead")
+
+    frame_times, offsets, positions, speeds = frame_arrays(trajectories, frame_interval)
+    metadata = trajectories.metadata
+
+    processes = max(1, min(processes, len(frame_times)))
+    if processes == 1:
+        render_frames(path, metadata, frame_times, offsets, positions, speeds, fps, dpi)
+        return len(frame_times)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    workdir = tempfile.mkdtemp(prefix="idm_animation_")
+    extension = os.path.splitext(path)[1]
+    bounds = np.linspace(0, len(frame_times), processes + 1).astype(int)
+
+    chunks = []
+    for c in range(processes):
+        first, last = bounds[c], bounds[c + 1]
+        rows = slice(offsets[first], offsets[last])
+        chunks.append((os.path.join(workdir, f"chunk_{c:03d}{extension}"), metadata,
+                       frame_times[first:last], offsets[first:last + 1] - offsets[first],
+                       positions[rows], speeds[rows], fps, dpi))
+
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = list(pool.map(_render_chunk, chunks))
+        _concatenate(parts, path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return len(frame_times)
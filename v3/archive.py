@@ -0,0 +1,231 @@
+"""
+Compressed trajectory archive.
+
+Columns are quantized to fixed point (position 1 cm, speed 0.01 m/s,
+acceleration 0.001 m/s², time in steps), delta-encoded along each vehicle's
+trajectory and stored in the smallest integer type that fits, then
+compressed with zlib. Rows are chunked by vehicle group and time block, so
+one vehicle or one time window is decoded without touching the rest.
+
+File layout:
+    MAGIC | chunk 0 | chunk 1 | ... | header (JSON) | header length (uint64)
+The header holds the metadata, scales and the chunk table
+(first/last vehicle, first/last step, byte offset and length, rows).
+Within a chunk, each vehicle segment keeps its first value per column
+(int64 bases) and the deltas of the following rows.
+"""
+import io
+import json
+import struct
+import time
+import zlib
+import numpy as np
+from trajectories import COLUMNS, Trajectories
+
+MAGIC = b"IDMARCH1"
+SCALES = {"position": 100, "speed": 100, "acceleration": 1000}   # Fixed-point units per SI unit
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _smallest_int(values):
+    if len(values) == 0:
+        return np.int8
+    low, high = int(values.min()), int(values.max())
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+def _pack(arrays):
+    """Serialize named integer arrays: per array name, dtype and length, then raw bytes."""
+    buffer = io.BytesIO()
+    for name, array in arrays.items():
+        encoded = name.encode()
+        buffer.write(struct.pack("<B", len(encoded)) + encoded)
+        buffer.write(struct.pack("<cQ", array.dtype.char.encode(), len(array)))
+        buffer.write(array.tobytes())
+    return buffer.getvalue()
+
+
+def _unpack(data):
+    arrays, position = {}, 0
+    while position < len(data):
+        (size,) = struct.unpack_from("<B", data, position)
+        name = data[position + 1:position + 1 + size].decode()
+        position += 1 + size
+        char, length = struct.unpack_from("<cQ", data, position)
+        position += struct.calcsize("<cQ")
+        dtype = np.dtype(char.decode())
+        arrays[name] = np.frombuffer(data, dtype=dtype, count=length, offset=position)
+        position += length * dtype.itemsize
+    return arrays
+
+
+def _delta_encode(values, starts):
+    """Deltas along segments starting at starts (first delta of each segment is 0); returns (bases, deltas)."""
+    deltas = np.empty_like(values)
+    deltas[0] = 0
+    deltas[1:] = values[1:] - values[:-1]
+    deltas[starts] = 0
+    return values[starts], deltas
+
+
+def _delta_decode(bases, deltas, starts, lengths):
+    cumulative = np.cumsum(deltas, dtype=np.int64)
+    return cumulative - np.repeat(cumulative[starts] - bases, lengths)
+
+
+# ===== Writer =====
+def write_archive(path, trajectories, vehicles_per_chunk=64, steps_per_chunk=1000, level=6):
+    """Write trajectories to an archive; returns the header (with the chunk table)."""
+    metadata = trajectories.metadata
+    columns = trajectories.columns
+    t = np.asarray(columns["t"])
+    dt = metadata.get("simulation_time_step") or float(np.min(np.diff(np.unique(t))))
+    t0 = float(t.min()) if len(t) else 0.0
+
+    rows = len(t)
+    vehicle = np.repeat(np.arange(len(trajectories)), np.diff(trajectories.offsets))
+    quantized = {"step": np.rint((t - t0) / dt).astype(np.int64)}
+    for name, scale in SCALES.items():
+        quantized[name] = np.rint(np.asarray(columns[name]) * scale).astype(np.int64)
+
+    # Group rows by (vehicle group, time block); the stable sort keeps vehicle/time order inside
+    group = vehicle // vehicles_per_chunk
+    block = quantized["step"] // steps_per_chunk
+    order = np.argsort(group * (int(block.max(initial=0)) + 1) + block, kind="stable")
+    key = (group * (int(block.max(initial=0)) + 1) + block)[order]
+    bounds = np.flatnonzero(np.diff(key)) + 1
+    chunk_starts = np.concatenate([[0], bounds]) if rows else np.array([], dtype=np.int64)
+    chunk_ends = np.concatenate([bounds, [rows]]) if rows else np.array([], dtype=np.int64)
+
+    table = []
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        for start, end in zip(chunk_starts, chunk_ends):
+            selected = order[start:end]
+            chunk_vehicle = vehicle[selected]
+
+            # Vehicle segments inside the chunk
+            segment_starts = np.flatnonzero(np.diff(chunk_vehicle, prepend=-1))
+            lengths = np.diff(np.append(segment_starts, len(selected)))
+
+            arrays = {"vehicle": chunk_vehicle[segment_starts].astype(np.int32),
+                      "length": lengths.astype(np.int32)}
+            for name, values in quantized.items():
+                bases, deltas = _delta_encode(values[selected], segment_starts)
+                arrays[f"{name}.base"] = bases
+                arrays[f"{name}.delta"] = deltas.astype(_smallest_int(deltas))
+
+            payload = zlib.compress(_pack(arrays), level)
+            steps = quantized["step"][selected]
+            table.append([int(chunk_vehicle[0]), int(chunk_vehicle[-1]), int(steps.min()), int(steps.max()),
+                          f.tell(), len(payload), int(len(selected))])
+            f.write(payload)
+
+        header = {"metadata": metadata, "t0": t0, "dt": dt, "scales": SCALES, "rows": int(rows),
+                  "vehicle_ids": np.asarray(trajectories.vehicle_ids).tolist(), "chunks": table}
+        encoded = json.dumps(header).encode()
+        f.write(encoded)
+        f.write(struct.pack("<Q", len(encoded)))
+    return header
+
+
+# ===== Reader =====
+class Archive:
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: not a trajectory archive")
+            f.seek(-8, 2)
+            (size,) = struct.unpack("<Q", f.read(8))
+            f.seek(-8 - size, 2)
+            self.header = json.loads(f.read(size))
+
+        self.metadata = self.header["metadata"]
+        self.vehicle_ids = np.array(self.header["vehicle_ids"], dtype=np.int64)
+        self.chunks = np.array(self.header["chunks"], dtype=np.int64).reshape(-1, 7)
+
+
+    def _decode(self, chunk_indices):
+        """Decode chunks into rows (vehicle index, t, position, speed, acceleration), sorted by vehicle and time."""
+        parts = []
+        with open(self.path, "rb") as f:
+            for k in chunk_indices:
+                _, _, _, _, offset, size, _ = self.chunks[k]
+                f.seek(offset)
+                arrays = _unpack(zlib.decompress(f.read(size)))
+
+                lengths = arrays["length"].astype(np.int64)
+                starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+                part = {"vehicle": np.repeat(arrays["vehicle"].astype(np.int64), lengths)}
+                for name in ("step",) + tuple(SCALES):
+                    part[name] = _delta_decode(arrays[f"{name}.base"], arrays[f"{name}.delta"], starts, lengths)
+                parts.append(part)
+
+        if not parts:
+            return {name: np.empty(0, dtype=np.int64) for name in ("vehicle", "step") + tuple(SCALES)}
+        rows = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+        order = np.lexsort((rows["step"], rows["vehicle"]))
+        return {name: values[order] for name, values in rows.items()}
+
+
+    def _to_trajectories(self, rows, vehicles=None):
+        vehicles = np.unique(rows["vehicle"]) if vehicles is None else vehicles
+        counts = np.bincount(np.searchsorted(vehicles, rows["vehicle"]), minlength=len(vehicles))
+        offsets = np.zeros(len(vehicles) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        columns = {"t": self.header["t0"] + rows["step"] * self.header["dt"]}
+        for name, scale in SCALES.items():
+            columns[name] = rows[name] / scale
+        return Trajectories(self.vehicle_ids[vehicles], offsets, columns, dict(self.metadata))
+
+
+    def read(self):
+        """All trajectories (quantized values)."""
+        return self._to_trajectories(self._decode(range(len(self.chunks))), np.arange(len(self.vehicle_ids)))
+
+
+    def vehicle(self, vehicle_id):
+        """Columns of one vehicle by id, decoding only its chunks."""
+        k = int(np.flatnonzero(self.vehicle_ids == vehicle_id)[0])
+        chunks = np.flatnonzero((self.chunks[:, 0] <= k) & (self.chunks[:, 1] >= k))
+        rows = self._decode(chunks)
+        mine = rows["vehicle"] == k
+        return self._to_trajectories({name: values[mine] for name, values in rows.items()}).vehicle(0)
+
+
+    def window(self, t_min, t_max):
+        """Trajectories restricted to [t_min, t_max], decoding only overlapping time blocks."""
+        t0, dt = self.header["t0"], self.header["dt"]
+        first, last = np.ceil((t_min - t0) / dt - 1e-9), np.floor((t_max - t0) / dt + 1e-9)
+        chunks = np.flatnonzero((self.chunks[:, 3] >= first) & (self.chunks[:, 2] <= last))
+        rows = self._decode(chunks)
+        inside = (rows["step"] >= first) & (rows["step"] <= last)
+        return self._to_trajectories({name: values[inside] for name, values in rows.items()})
+
+
+def archive_report(path, trajectories=None):
+    """Compression ratio (vs. float64 columns) and full decode throughput of an archive."""
+    import os
+
+    archive = Archive(path)
+    rows = archive.header["rows"]
+    raw_bytes = rows * len(COLUMNS) * 8
+    size = os.path.getsize(path)
+
+    start = time.perf_counter()
+    decoded = archive.read()
+    elapsed = time.perf_counter() - start
+
+    report = {"rows": rows, "bytes": size, "raw_bytes": raw_bytes, "ratio": raw_bytes / size,
+              "decode_seconds": elapsed, "rows_per_second": rows / elapsed, "raw_mb_per_second": raw_bytes / elapsed / 1e6}
+    if trajectories is not None:
+        report["max_error"] = {name: float(np.max(np.abs(decoded.columns[name] - trajectories.columns[name])))
+                               for name in COLUMNS}
+    return report
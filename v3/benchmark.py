@@ -0,0 +1,82 @@
+import time
+import tracemalloc
+import simulator
+from config import Config
+from simulator import Simulator
+from vehicle import Vehicle, VehicleParameters
+
+
+def dict_vehicle_class():
+    """
+    Baseline layout: the same Vehicle methods on an instance __dict__, with each
+    vehicle holding its own copy of the parameters (params points to itself).
+    """
+    skip = set(Vehicle.__slots__) | {"__slots__", "__init__"}
+    namespace = {name: value for name, value in vars(Vehicle).items() if name not in skip}
+
+    def __init__(self, config, id, vehicle_front=None, params=None):
+        Vehicle.__init__(self, config, id, vehicle_front, params)
+        for name in VehicleParameters.__slots__:
+            setattr(self, name, getattr(self.params, name))
+        self.params = self
+
+    namespace["__init__"] = __init__
+    return type("DictVehicle", (), namespace)
+
+
+def vehicle_memory(config, count=1000, vehicle_class=Vehicle):
+    """Bytes allocated per vehicle object (without its recorded history)."""
+    params = VehicleParameters(config)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    vehicles = []
+    v_front = None
+    for k in range(count):
+        v_front = vehicle_class(config, k + 1, v_front, params)
+        vehicles.append(v_front)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def step_time(config, vehicle_class=Vehicle):
+    """Mean wall time per simulation step (s) and number of vehicles."""
+    original, simulator.Vehicle = simulator.Vehicle, vehicle_class
+    try:
+        sim = Simulator(config, verbose=False)
+        start = time.perf_counter()
+        sim.run()
+        elapsed = time.perf_counter() - start
+    finally:
+        simulator.Vehicle = original
+    num_steps = int((config.time_max - 1) / config.simulation_time_step) + 1
+    return elapsed / num_steps, len(sim.vehicles)
+
+
+def benchmark(experiments=(1, 2, 3, 4), seed=1, repeats=3):
+    """Per-vehicle memory and step time (best of repeats), slotted vs. dict-based vehicles, for the v3 experiments."""
+    layouts = {"slots": Vehicle, "dict": dict_vehicle_class()}
+    rows = []
+    for experiment in experiments:
+        row = {"experiment": experiment}
+        for layout, vehicle_class in layouts.items():
+            row[f"bytes_per_vehicle_{layout}"] = vehicle_memory(Config(seed, experiment), vehicle_class=vehicle_class)
+            best = None
+            for _ in range(repeats):
+                t_step, vehicles = step_time(Config(seed, experiment), vehicle_class)
+                best = t_step if best is None else min(best, t_step)
+            row[f"step_time_{layout}"] = best
+            row["vehicles"] = vehicles
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    print(f"{'experiment':>10} {'vehicles':>9} {'bytes/vehicle':>22} {'step (ms)':>22}")
+    print(f"{'':>10} {'':>9} {'dict':>7} {'slots':>7} {'gain':>6} {'dict':>7} {'slots':>7} {'gain':>6}")
+    for row in benchmark():
+        memory = row["bytes_per_vehicle_dict"], row["bytes_per_vehicle_slots"]
+        step = row["step_time_dict"] * 1000, row["step_time_slots"] * 1000
+        print(f"{row['experiment']:>10} {row['vehicles']:>9} "
+              f"{memory[0]:>7.0f} {memory[1]:>7.0f} {1 - memory[1] / memory[0]:>6.0%} "
+              f"{step[0]:>7.3f} {step[1]:>7.3f} {1 - step[1] / step[0]:>6.0%}")
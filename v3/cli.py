@@ -0,0 +1,351 @@
+"""
+Command-line entry point for v3 simulations.
+
+    python cli.py run   [--seed N] [--experiment E] [--set field=value ...] [--output run.npz] [--plot] [--live]
+    python cli.py sweep [--seeds 1-20] [--experiments 1,2,3,4] [--vary field=v1,v2] [--processes P]
+    python cli.py ensemble [--seeds 1-1000] [--experiment E] [--processes P] [--output grid.npz]
+    python cli.py plot  run.npz [--save figure.png] [--window X_MIN X_MAX T_MIN T_MAX]
+    python cli.py animate run.npz movie.mp4|movie.gif [--frame-interval 1] [--fps 20] [--processes P]
+    python cli.py archive run.npz run.idma
+    python cli.py serve [--port 8765] [--workers W] [--results DIR] [--max-queue 64]
+
+plot and animate also read archives (.idma). Plots draw through the
+trajectories' SpaceTimeIndex, kept next to a results file (run.index.npz)
+and reused while it is newer than the results.
+
+Only the standard library is imported at startup; NumPy (results files) and
+matplotlib (plotting) are imported when a command needs them, so short runs
+launched as many separate processes do not pay for them. --timing reports
+the startup and per-phase times.
+"""
+import argparse
+import ast
+import os
+import sys
+import time
+
+_START = time.perf_counter()
+
+
+def parse_value(text):
+    """Parse an override value: Python literal (int, float, bool, ...) or plain string."""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_overrides(items):
+    """Parse ["field=value", ...] into a dict of config overrides."""
+    overrides = {}
+    for item in items or []:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected field=value, got {item!r}")
+        overrides[name.strip()] = parse_value(value.strip())
+    return overrides
+
+
+def split_overrides(seed, experiment, overrides):
+    """(seed, experiment, other overrides): seed and experiment given as overrides replace the defaults."""
+    overrides = dict(overrides)
+    return overrides.pop("seed", seed), overrides.pop("experiment", experiment), overrides
+
+
+def parse_int_list(text):
+    """Parse "1,3,5" or "1-10" (or a mix, "1-3,7") into a list of ints."""
+    values = []
+    for part in text.split(","):
+        first, sep, last = part.partition("-")
+        if sep:
+            values.extend(range(int(first), int(last) + 1))
+        else:
+            values.append(int(part))
+    return values
+
+
+def _report_timing(args, label, start):
+    if args.timing:
+        print(f"[timing] {label}: {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+
+
+def _make_simulator(config, engine, segments, verbose):
+    if engine == "decomposed":
+        from decomposition import DecomposedSimulator
+        return DecomposedSimulator(config, segments, verbose=verbose)
+
+    from simulator import Simulator
+    return Simulator(config, verbose=verbose)
+
+
+# ===== run =====
+def command_run(args):
+    from config import Config
+
+    seed, experiment, overrides = split_overrides(args.seed, args.experiment, parse_overrides(args.set))
+    config = Config(seed, experiment, **overrides)
+    sim = _make_simulator(config, args.engine, args.segments, not args.quiet)
+
+    if args.live:
+        if args.engine != "reference":
+            raise SystemExit("--live is only supported by the reference engine")
+        from liveview import LiveView
+        view = LiveView(config, every=args.live_every)
+        view.attach(sim)
+
+    start = time.perf_counter()
+    sim.run()
+    _report_timing(args, "simulation", start)
+
+    if args.live:
+        report = view.report()
+        print(f"Live view: {report['frames']} frames, {report['overhead']:.1%} of wall time", file=sys.stderr)
+
+    if args.output or args.plot:
+        from trajectories import Trajectories
+        start = time.perf_counter()
+        trajectories = Trajectories.from_vehicles(sim.vehicles, config)
+        if args.output:
+            trajectories.save(args.output)
+        _report_timing(args, "output", start)
+
+    if args.plot:
+        from plotting import plot_time_space_diagram
+        index = None
+        if args.output:
+            from spacetime import SpaceTimeIndex
+            index = SpaceTimeIndex.for_file(args.output, trajectories)
+        plot_time_space_diagram(trajectories, config, index=index)
+
+
+# ===== sweep =====
+def _run_summary(task):
+    """Run one sweep task (seed, experiment, overrides) quietly and return summary metrics."""
+    from config import Config
+    from simulator import Simulator
+
+    seed, experiment, overrides = task
+    config = Config(seed, experiment, **overrides)
+    sim = Simulator(config, verbose=False)
+
+    start = time.perf_counter()
+    sim.run()
+
+    summary = {"seed": seed, "experiment": experiment}
+    summary.update(overrides)
+    summary["vehicles"] = len(sim.vehicles)
+    summary["inflow_rate"] = sim.inflow_rate
+    summary.update({name: round(value, 3) for name, value in sim.travel_times.summary().items()})
+    summary["runtime"] = round(time.perf_counter() - start, 3)
+    summary["health"] = ",".join(f"{event.action}:{event.monitor}" for event in sim.health_events) or "ok"
+    return summary
+
+
+def sweep_tasks(seeds, experiments, overrides, vary):
+    """All (seed, experiment, overrides) combinations of a sweep."""
+    grids = [{}]
+    for name, values in vary.items():
+        grids = [dict(grid, **{name: value}) for grid in grids for value in values]
+
+    return [split_overrides(seed, experiment, dict(overrides, **grid))
+            for experiment in experiments for grid in grids for seed in seeds]
+
+
+def command_sweep(args):
+    import csv
+    from concurrent.futures import ProcessPoolExecutor
+
+    vary = {}
+    for item in args.vary or []:
+        name, _, values = item.partition("=")
+        vary[name.strip()] = [parse_value(value) for value in values.split(",")]
+
+    tasks = sweep_tasks(parse_int_list(args.seeds), parse_int_list(args.experiments),
+                        parse_overrides(args.set), vary)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        summaries = list(pool.map(_run_summary, tasks))
+    _report_timing(args, f"sweep ({len(tasks)} runs)", start)
+
+    fields = list(summaries[0])
+    if args.output:
+        with open(args.output, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(summaries)
+    else:
+        print("\t".join(fields))
+        for summary in summaries:
+            print("\t".join(str(summary[field]) for field in fields))
+
+
+# ===== ensemble =====
+def command_ensemble(args):
+    from ensemble import run_ensemble
+
+    overrides = parse_overrides(args.set)
+    if "seed" in overrides:
+        raise SystemExit("ensemble: choose seeds with --seeds, not --set seed=...")
+    _, experiment, overrides = split_overrides(None, args.experiment, overrides)
+
+    start = time.perf_counter()
+    statistics = run_ensemble(parse_int_list(args.seeds), experiment, overrides, args.processes)
+    _report_timing(args, f"ensemble ({statistics.runs} runs)", start)
+
+    print(f"{'metric':<12} {'mean':>10} {'std':>10} {'q5%':>10} {'q50%':>10} {'q95%':>10}")
+    for name, summary in statistics.summary().items():
+        print(f"{name:<12} {summary['mean']:>10.2f} {summary['std']:>10.2f} {summary['q0.05']:>10.2f} "
+              f"{summary['q0.5']:>10.2f} {summary['q0.95']:>10.2f}")
+
+    if args.output:
+        statistics.save(args.output)
+
+
+def load_results(path):
+    """Trajectories from a run --output .npz file or a compressed archive (.idma)."""
+    if path.endswith(".idma"):
+        from archive import Archive
+        return Archive(path).read()
+
+    from trajectories import Trajectories
+    return Trajectories.load(path)
+
+
+# ===== plot =====
+def command_plot(args):
+    from types import SimpleNamespace
+
+    start = time.perf_counter()
+    trajectories = load_results(args.results)
+    index = None
+    if not args.results.endswith(".idma"):
+        from spacetime import SpaceTimeIndex
+        index = SpaceTimeIndex.for_file(args.results, trajectories)
+    _report_timing(args, "load", start)
+
+    from plotting import plot_time_space_diagram
+    plot_time_space_diagram(trajectories, SimpleNamespace(**trajectories.metadata), args.save, index, args.window)
+
+
+# ===== animate =====
+def command_animate(args):
+    from animation import export_animation, writer_available
+
+    if not writer_available(args.output):
+        raise SystemExit(f"Cannot write {args.output}: ffmpeg was not found. Install ffmpeg, "
+                         f"or export a GIF instead (e.g. {os.path.splitext(args.output)[0]}.gif).")
+
+    start = time.perf_counter()
+    trajectories = load_results(args.results)
+    frames = export_animation(trajectories, args.output, args.frame_interval, args.fps,
+                              processes=args.processes)
+    _report_timing(args, f"animation ({frames} frames)", start)
+
+
+# ===== archive =====
+def command_archive(args):
+    from trajectories import Trajectories
+    from archive import write_archive, archive_report
+
+    start = time.perf_counter()
+    trajectories = Trajectories.load(args.results)
+    write_archive(args.output, trajectories)
+    _report_timing(args, "archive", start)
+
+    report = archive_report(args.output)
+    print(f"{report['rows']} rows: {report['raw_bytes'] / 1e6:.1f} MB -> {report['bytes'] / 1e6:.2f} MB "
+          f"(ratio {report['ratio']:.1f}), decode {report['rows_per_second'] / 1e6:.1f} M rows/s")
+
+
+# ===== serve =====
+def command_serve(args):
+    import asyncio
+    from jobserver import JobServer
+
+    server = JobServer(args.results, args.workers, args.max_queue)
+    print(f"Serving simulation jobs on 127.0.0.1:{args.port} (results in {args.results})", file=sys.stderr)
+    try:
+        asyncio.run(server.serve(port=args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="IDM stop-and-go wave simulations (v3)")
+    parser.add_argument("--timing", action="store_true", help="report startup and phase times on stderr")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run one simulation")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--experiment", type=int, default=3, choices=(1, 2, 3, 4))
+    run.add_argument("--set", action="append", metavar="FIELD=VALUE", help="override a Config field")
+    run.add_argument("--engine", choices=("reference", "decomposed"), default="reference")
+    run.add_argument("--segments", type=int, default=None, help="segments for the decomposed engine")
+    run.add_argument("--output", help="save trajectories to this .npz file")
+    run.add_argument("--plot", action="store_true", help="show the time-space diagram")
+    run.add_argument("--quiet", action="store_true", help="suppress progress output")
+    run.add_argument("--live", action="store_true", help="show a live time-space view (press q to stop)")
+    run.add_argument("--live-every", type=int, default=10, help="steps between live view updates")
+    run.set_defaults(handler=command_run)
+
+    sweep = commands.add_parser("sweep", help="run many simulations in a process pool")
+    sweep.add_argument("--seeds", default="1")
+    sweep.add_argument("--experiments", default="3")
+    sweep.add_argument("--set", action="append", metavar="FIELD=VALUE", help="override a Config field")
+    sweep.add_argument("--vary", action="append", metavar="FIELD=V1,V2", help="sweep a Config field")
+    sweep.add_argument("--processes", type=int, default=None)
+    sweep.add_argument("--output", help="write the summary table to this CSV file")
+    sweep.set_defaults(handler=command_sweep)
+
+    ensemble = commands.add_parser("ensemble", help="streaming statistics over many seeds")
+    ensemble.add_argument("--seeds", default="1-20")
+    ensemble.add_argument("--experiment", type=int, default=3, choices=(1, 2, 3, 4))
+    ensemble.add_argument("--set", action="append", metavar="FIELD=VALUE", help="override a Config field")
+    ensemble.add_argument("--processes", type=int, default=None)
+    ensemble.add_argument("--output", help="save grid mean/std/quantiles to this .npz file")
+    ensemble.set_defaults(handler=command_ensemble)
+
+    plot = commands.add_parser("plot", help="plot saved trajectories")
+    plot.add_argument("results", help=".npz file written by run --output, or an archive")
+    plot.add_argument("--save", help="save the figure instead of showing it")
+    plot.add_argument("--window", nargs=4, type=float, metavar=("X_MIN", "X_MAX", "T_MIN", "T_MAX"),
+                      help="draw only this part of the time-space diagram")
+    plot.set_defaults(handler=command_plot)
+
+    animate = commands.add_parser("animate", help="export an animation of saved trajectories")
+    animate.add_argument("results", help=".npz file written by run --output, or an archive")
+    animate.add_argument("output", help="output file (.mp4 needs ffmpeg, .gif uses Pillow)")
+    animate.add_argument("--frame-interval", type=float, default=1.0, help="simulated seconds per frame")
+    animate.add_argument("--fps", type=int, default=20)
+    animate.add_argument("--processes", type=int, default=1)
+    animate.set_defaults(handler=command_animate)
+
+    archive = commands.add_parser("archive", help="write saved trajectories to a compressed archive")
+    archive.add_argument("results", help=".npz file written by run --output")
+    archive.add_argument("output", help="archive file (.idma)")
+    archive.set_defaults(handler=command_archive)
+
+    serve = commands.add_parser("serve", help="run the local simulation job server (see jobserver.py)")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--workers", type=int, default=None)
+    serve.add_argument("--results", default="results", help="directory for result files")
+    serve.add_argument("--max-queue", type=int, default=64, help="queued jobs before submits are held back")
+    serve.set_defaults(handler=command_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    _report_timing(args, f"startup ({len(sys.modules)} modules loaded)", _START)
+    args.handler(args)
+
+    if args.timing:
+        heavy = [name for name in ("numpy", "matplotlib") if name in sys.modules]
+        print(f"[timing] heavy modules loaded: {', '.join(heavy) or 'none'}", file=sys.stderr)
+        _report_timing(args, "total", _START)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
 import random
 
 class Config:
-    def __init__(self, seed=1):
+    def __init__(self, seed=1, experiment=3, **overrides):
+        """
+        Simulation parameters.
+
+        - experiment selects the inflow/bottleneck scenario (see below).
+        - overrides replace any field by name, e.g. Config(road_length=3000).
+          Fields derived from others (initial speed, bottleneck position/limit,
+          bottleneck end for long bottlenecks) follow the overridden values
+          unless they are overridden themselves.
+        """
 
         # === Initialize Random Seeds ===
         self.seed = seed
@@ -15,6 +24,13 @@ class Config:
         self.simulation_time_step = 0.1      # Simulation time step Δt (s)
         self.time_max             = 1000     # Total simulation time (s)
 
+        # Integration scheme for speed/position updates:
+        #   "euler":       legacy update, position advanced with the already-updated speed
+        #   "ballistic":   x += v*dt + 0.5*a*dt², exact stop when the vehicle halts within a step
+        #   "trapezoidal": x += 0.5*(v_old + v_new)*dt, consistent with the constrained speed
+        #   "rk4":         classical Runge-Kutta on the noise-free IDM (noise frozen per step)
+        self.integration_scheme = "euler"
+
         # === IDM Parameters ===
         self.idm_minimum_spacing      = 2    # Minimum spacing s0 (m)
         self.idm_safety_time_headway  = 1    # Safety time headway T (s)
@@ -23,43 +39,80 @@ class Config:
         self.idm_delay                = 0.4  # Reaction delay τ (s)
 
         self.vehicle_length       = 5                 # Vehicle length L (m)
-        self.initial_speed        = self.speed_limit  # Initial speed (m/s)
         self.initial_acceleration = 0                 # Initial acceleration (m/s²)
         self.relative_speed_noise = 0.5               # Noise σ for perceived speed (m/s)
 
         # === Bottleneck Settings ===
         self.bottleneck_length = 200                         # Bottleneck length (m)
-        self.bottleneck_x_start = self.road_length - 500     # Bottleneck start position (m)
-        self.bottleneck_x_end = self.bottleneck_x_start + self.bottleneck_length  # End position (m)
         self.bottleneck_t_start = 100                        # Activation time (s)
-        self.bottleneck_speed_limit = self.speed_limit * 0.2 # Reduced speed limit (m/s)
         self.percentage_influenced_by_bottleneck = 0.7       # Fraction of vehicles affected
 
+        # === Run Health Monitors ===
+        # Action per monitor: "abort" (stop the run), "flag" (record and continue), "continue" (off)
+        self.health_check_interval  = 1       # Time between checks (s)
+        self.breakdown_action       = "flag"  # Breakdown upstream of the bottleneck before it is active
+        self.breakdown_speed        = 10      # Speed counted as breakdown (m/s)
+        self.saturation_action      = "flag"  # Minimum-gap constraint active too often
+        self.saturation_fraction    = 0.01    # Tolerated share of samples with an active gap constraint
+        self.saturation_window      = 50      # Window for the share (s)
+        self.steady_state_action    = "continue"  # Mean speed stationary (e.g. "abort" to stop early)
+        self.steady_state_window    = 100     # Length of each of the two compared windows (s)
+        self.steady_state_tolerance = 0.02    # Tolerated relative change of the mean speed
+
+        # === Travel Time Accounting ===
+        self.stop_speed     = 1      # Speed below which a vehicle counts as stopped (m/s)
+        self.outflow_window = 60     # Window of the rolling outflow at the road end (s)
+
+        # === Control ===
+        self.control_interval = 1             # Time between controller calls (s), see controllers.py
+
         # === Experiment Selection ===
         # 1: Deterministic inflow + short bottleneck
         # 2: Stochastic inflow + short bottleneck
         # 3: Deterministic inflow + long bottleneck
         # 4: Stochastic inflow + long bottleneck
-        whichExperiment = 3
+        self.experiment = experiment
 
         # === Vehicle Generation Settings ===
         # Vehicle inter-arrival time = min_interval + exponential(extra_interval)
-        if whichExperiment == 1:
+        if experiment == 1:
             self.vehicle_min_interval = 2.5
             self.vehicle_extra_interval = 0
-            self.bottleneck_t_end = 200
+            bottleneck_long = False
 
-        elif whichExperiment == 2:
+        elif experiment == 2:
             self.vehicle_min_interval = 1.5
             self.vehicle_extra_interval = 1
-            self.bottleneck_t_end = 200
+            bottleneck_long = False
 
-        elif whichExperiment == 3:
+        elif experiment == 3:
             self.vehicle_min_interval = 2.5
             self.vehicle_extra_interval = 0
-            self.bottleneck_t_end = self.time_max
+            bottleneck_long = True
 
-        elif whichExperiment == 4:
+        elif experiment == 4:
             self.vehicle_min_interval = 1.5
             self.vehicle_extra_interval = 1
-            self.bottleneck_t_end = self.time_max
\ No newline at end of file
+            bottleneck_long = True
+
+        else:
+            raise ValueError(f"Unknown experiment: {experiment}")
+
+        # === Overrides ===
+        derived = ("initial_speed", "bottleneck_x_start", "bottleneck_x_end",
+                   "bottleneck_speed_limit", "bottleneck_t_end")
+        for name, value in overrides.items():
+            if not hasattr(self, name) and name not in derived:
+                raise ValueError(f"Unknown config field: {name}")
+            setattr(self, name, value)
+
+        # === Derived Settings ===
+        def derive(name, value):
+            if name not in overrides:
+                setattr(self, name, value)
+
+        derive("initial_speed", self.speed_limit)                                    # Initial speed (m/s)
+        derive("bottleneck_x_start", self.road_length - 500)                         # Bottleneck start position (m)
+        derive("bottleneck_x_end", self.bottleneck_x_start + self.bottleneck_length)  # End position (m)
+        derive("bottleneck_speed_limit", self.speed_limit * 0.2)                     # Reduced speed limit (m/s)
+        derive("bottleneck_t_end", self.time_max if bottleneck_long else 200)        # Deactivation time (s)
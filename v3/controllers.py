@@ -0,0 +1,111 @@
+"""
+Traffic controllers for Simulator.add_controller.
+
+Every config.control_interval seconds the simulator builds NumPy arrays of
+the current state (vehicle ids, positions, speeds; front to back) and calls
+each controller once:
+
+    v0_cap, a_cap = controller.control(t, ids, positions, speeds)
+
+Both results are float arrays aligned with the inputs (or None for no
+action): v0_cap caps the vehicle's desired speed v0 (m/s), a_cap caps its
+IDM acceleration (m/s²); NaN leaves a vehicle uncontrolled. Caps of several
+controllers are combined by their minimum and hold until the next interval.
+"""
+import numpy as np
+
+
+class Controller:
+    """Base class: no action."""
+
+    def control(self, t, ids, positions, speeds):
+        return None, None
+
+
+class VariableSpeedLimit(Controller):
+    """
+    Variable speed limit upstream of the bottleneck.
+
+    When the mean speed in the detection zone drops below `trigger_speed`,
+    vehicles in the control zone get the reduced limit `limit`; the limit is
+    released once the detection speed recovers above `release_speed`.
+    Zones default to the 300 m before the bottleneck (detection) and the
+    1000 m before that (control).
+    """
+
+    def __init__(self, config, limit=15, trigger_speed=10, release_speed=20,
+                 control_zone=None, detection_zone=None):
+        x = config.bottleneck_x_start
+        self.limit = limit
+        self.trigger_speed = trigger_speed
+        self.release_speed = release_speed
+        self.detection_zone = detection_zone or (x - 300, x)
+        self.control_zone = control_zone or (max(0, x - 1300), x - 300)
+        self.active = False
+        self.activations = []
+
+
+    def control(self, t, ids, positions, speeds):
+        start, end = self.detection_zone
+        detected = speeds[(positions >= start) & (positions <= end)]
+        if len(detected):
+            mean_speed = detected.mean()
+            if not self.active and mean_speed < self.trigger_speed:
+                self.active = True
+                self.activations.append(t)
+            elif self.active and mean_speed > self.release_speed:
+                self.active = False
+
+        if not self.active:
+            return None, None
+
+        start, end = self.control_zone
+        in_zone = (positions >= start) & (positions <= end)
+        return np.where(in_zone, float(self.limit), np.nan), None
+
+
+class SpeedHarmonization(Controller):
+    """
+    Speed harmonization by a fraction of equipped vehicles.
+
+    Each equipped vehicle caps its desired speed at the mean speed of the
+    vehicles within `look_ahead` metres ahead of it (plus `margin`), and its
+    acceleration at `max_acceleration`, smoothing the approach to slow
+    traffic. Equipment is a fixed function of the vehicle id, so it does not
+    consume the simulation's random stream.
+    """
+
+    def __init__(self, config, fraction=0.2, look_ahead=500, margin=2, max_acceleration=1.0, seed=0):
+        self.fraction = fraction
+        self.look_ahead = look_ahead
+        self.margin = margin
+        self.max_acceleration = max_acceleration
+        self.seed = seed
+        self.road_length = config.road_length
+
+
+    def equipped(self, ids):
+        """Equipped mask for vehicle ids (multiplicative hash, uniform in [0, 1))."""
+        hashed = (ids.astype(np.uint64) * np.uint64(2654435761) + np.uint64(self.seed)) % np.uint64(2 ** 32)
+        return hashed / 2 ** 32 < self.fraction
+
+
+    def control(self, t, ids, positions, speeds):
+        on_road = positions < self.road_length
+        equipped = self.equipped(ids) & on_road
+        if not equipped.any():
+            return None, None
+
+        # Mean speed over (x, x + look_ahead] from prefix sums on ascending positions
+        order = np.argsort(positions, kind="stable")
+        x = positions[order]
+        cumulative = np.concatenate([[0.0], np.cumsum(speeds[order])])
+        first = np.searchsorted(x, positions, side="right")
+        last = np.searchsorted(x, positions + self.look_ahead, side="right")
+        count = last - first
+        ahead = np.divide(cumulative[last] - cumulative[first], count,
+                          out=np.full(len(x), np.nan), where=count > 0)
+
+        v0_cap = np.where(equipped, ahead + self.margin, np.nan)
+        a_cap = np.where(equipped, float(self.max_acceleration), np.nan)
+        return v0_cap, a_cap
@@ -0,0 +1,375 @@
+import random
+import threading
+import multiprocessing as mp
+from array import array
+from itertools import chain
+from multiprocessing import shared_memory
+from config import Config
+from vehicle import idm_acceleration, next_speed, displacement
+
+
+# Per-vehicle state columns kept in shared memory (float64, indexed by vehicle order)
+STATE_FIELDS = ("position", "speed", "speed_previous", "acceleration", "v0", "noise", "influenced")
+
+# Control block layout (float64): [time, number of vehicles, stop flag, exited, cut_0 .. cut_K]
+_CONTROL_TIME = 0
+_CONTROL_COUNT = 1
+_CONTROL_STOP = 2
+_CONTROL_EXITED = 3
+_CONTROL_CUTS = 4
+
+# Seconds a barrier waits before the run is considered hung (a worker died or stalled)
+BARRIER_TIMEOUT = 60
+
+
+class VehicleRecord:
+    """Recorded trajectory of one vehicle, compatible with Vehicle.history for plotting."""
+
+    def __init__(self, id, influenced_by_bottleneck):
+        self.id = id
+        self.influenced_by_bottleneck = influenced_by_bottleneck
+        self.history = []
+
+
+class DecomposedSimulator:
+    """
+    Spatial domain decomposition of the v3 simulator across worker processes.
+
+    - The road is split into num_segments contiguous segments of equal length;
+      each worker owns the vehicles currently inside its segment. Vehicles
+      beyond road_length still move and are recorded (as in Simulator), but
+      are outside the segment cuts: their range is split evenly over all
+      workers, so the most downstream segment does not accumulate them.
+    - All vehicle states live in shared memory. A worker reads the state of the
+      vehicle just ahead of its tail directly, so the boundary leader of the
+      next segment is exchanged without copies.
+    - Each step runs in the phases of Simulator.run (road check + acceleration,
+      speed, position) separated by barriers, so every vehicle sees exactly the
+      same neighbour states as in the single-process run.
+    - A failing worker aborts the barrier and reports its error on the results
+      queue; the parent raises it as RuntimeError and stops all workers.
+    - The parent owns the random stream: it generates vehicles and samples the
+      perception noise in vehicle order, exactly like Simulator. Results are
+      therefore identical to Simulator for the same seed.
+    """
+
+    def __init__(self, config: Config, num_segments=None, verbose=True):
+        if config.integration_scheme == "rk4":
+            raise ValueError("DecomposedSimulator does not support the rk4 integration scheme")
+
+        self.config = config
+        self.num_segments = num_segments or mp.cpu_count()
+        self.verbose = verbose
+        self.vehicles = []
+        self.next_generation_time = None
+
+        # Upper bound on the number of generated vehicles (inter-arrival time >= min_interval)
+        self.capacity = int((config.time_max - 1) / config.vehicle_min_interval) + 2
+
+
+    def run(self):
+        """Main simulation loop (parent side)."""
+        config = self.config
+        num_segments = self.num_segments
+
+        blocks = {name: shared_memory.SharedMemory(create=True, size=8 * self.capacity)
+                  for name in STATE_FIELDS}
+        control_block = shared_memory.SharedMemory(create=True, size=8 * (_CONTROL_CUTS + num_segments + 1))
+        state = {name: block.buf.cast('d') for name, block in blocks.items()}
+        control = control_block.buf.cast('d')
+
+        # Segment boundaries from downstream to upstream
+        boundaries = [config.road_length * (num_segments - k) / num_segments
+                      for k in range(1, num_segments)]
+
+        ctx = mp.get_context()
+        barrier = ctx.Barrier(num_segments + 1)
+        results = ctx.Queue()
+        workers = [
+            ctx.Process(target=_segment_worker,
+                        args=(config, w, num_segments, {name: block.name for name, block in blocks.items()},
+                              control_block.name, barrier, results))
+            for w in range(num_segments)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            number_of_vehicles = self._simulate(state, control, boundaries, barrier)
+
+            # Signal the workers to send their recorded states and stop
+            control[_CONTROL_STOP] = 1
+            barrier.wait(BARRIER_TIMEOUT)
+            columns = [None] * num_segments
+            for _ in workers:
+                segment, recorded, error = results.get(timeout=BARRIER_TIMEOUT)
+                if error is not None:
+                    raise RuntimeError(f"segment worker {segment} failed: {error}")
+                columns[segment] = recorded
+
+            self._build_records(columns, state, number_of_vehicles)
+
+        except threading.BrokenBarrierError:
+            raise RuntimeError(_worker_error(results)) from None
+
+        finally:
+            # Release workers still waiting (parent error), then make sure none is left behind
+            barrier.abort()
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+            for view in list(state.values()) + [control]:
+                view.release()
+            for block in list(blocks.values()) + [control_block]:
+                block.close()
+                block.unlink()
+
+        # Print summary after simulation completes
+        if self.verbose:
+            print("\nVehicle Number: ", len(self.vehicles))
+            print("Inflow Rate: ", int(len(self.vehicles) / (config.time_max - 1) * 3600), " veh/h\n" )
+
+
+    def _simulate(self, state, control, boundaries, barrier):
+        """Step loop: inflow, noise and segment cuts in the parent, updates in the workers."""
+        config = self.config
+        dt = config.simulation_time_step
+        num_steps = int((config.time_max - 1) / dt) + 1
+
+        position = state["position"]
+        noise = state["noise"]
+        sigma = config.relative_speed_noise
+        gauss = random.gauss
+
+        number_of_vehicles = 0
+        for i in range(num_steps):
+            t = 1 + i * dt  # simulation time starts at t = 1
+
+            # Print every 100 seconds
+            if self.verbose and abs(t % 100) < 1e-6:
+                print(f"step: {i}, time: {int(t)}")
+
+            # 1. Vehicle generation / inflow process (same random draws as Simulator)
+            number_of_vehicles = self._generate_vehicles(state, number_of_vehicles, t)
+
+            # Perception noise in vehicle order (same draws as Vehicle.update_acceleration).
+            # The draws must stay sequential in one stream to match Simulator; the shared
+            # block starts zeroed, so nothing is written without noise.
+            if sigma != 0:
+                noise[:number_of_vehicles] = array('d', [gauss(0, sigma) for _ in range(number_of_vehicles)])
+
+            # Contiguous vehicle ranges per segment (positions are non-increasing in vehicle order);
+            # vehicles past road_length come first and are left out of the segment cuts
+            exited = _count_at_or_beyond(position, number_of_vehicles, config.road_length)
+            control[_CONTROL_EXITED] = exited
+            control[_CONTROL_CUTS] = exited
+            for k, boundary in enumerate(boundaries):
+                control[_CONTROL_CUTS + 1 + k] = max(exited, _count_at_or_beyond(position, number_of_vehicles, boundary))
+            control[_CONTROL_CUTS + len(boundaries) + 1] = number_of_vehicles
+            control[_CONTROL_TIME] = t
+            control[_CONTROL_COUNT] = number_of_vehicles
+
+            # 2.-4. Publish the step, then road check + acceleration, speed, position, recording (in the workers)
+            for _ in range(5):
+                barrier.wait(BARRIER_TIMEOUT)
+
+        return number_of_vehicles
+
+
+    def _generate_vehicles(self, state, number_of_vehicles, t_current):
+        """Inflow process of Simulator._generate_vehicles writing new vehicles into shared state."""
+        t_min = self.config.vehicle_min_interval
+        extra_interval = self.config.vehicle_extra_interval
+
+        # Initialize the time for the next vehicle arrival
+        if self.next_generation_time is None:
+            if extra_interval > 0:
+                self.next_generation_time = (
+                    t_current + t_min + random.expovariate(1.0 / extra_interval)
+                )
+            else:
+                self.next_generation_time = t_current + t_min
+
+        while self.next_generation_time <= t_current:
+            k = number_of_vehicles
+            number_of_vehicles += 1
+
+            # Initial state as in Vehicle.__init__
+            state["position"][k] = 0
+            state["speed"][k] = self.config.initial_speed
+            state["speed_previous"][k] = self.config.initial_speed
+            state["acceleration"][k] = self.config.initial_acceleration
+            state["v0"][k] = self.config.initial_speed
+            state["influenced"][k] = random.random() < self.config.percentage_influenced_by_bottleneck
+
+            # Schedule next vehicle arrival
+            if extra_interval > 0:
+                interval = t_min + random.expovariate(1.0 / extra_interval)
+            else:
+                interval = t_min
+
+            self.next_generation_time = self.next_generation_time + interval
+
+        return number_of_vehicles
+
+
+    def _build_records(self, columns, state, number_of_vehicles):
+        """Merge the workers' recorded columns into per-vehicle histories."""
+        self.vehicles = [VehicleRecord(k + 1, bool(state["influenced"][k]))
+                         for k in range(number_of_vehicles)]
+
+        rows = []
+        for worker_columns in columns:
+            rows.extend(zip(*worker_columns))
+        rows.sort(key=lambda row: (row[0], row[1]))
+
+        for k, t, x, v, a in rows:
+            self.vehicles[int(k)].history.append({
+                "t": t,
+                "position": x,
+                "speed": v,
+                "acceleration": a
+            })
+
+
+def _count_at_or_beyond(position, n, boundary):
+    """Number of leading vehicles with position >= boundary (binary search)."""
+    low, high = 0, n
+    while low < high:
+        mid = (low + high) // 2
+        if position[mid] >= boundary:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def _worker_error(results):
+    """Error reported by the worker that broke the barrier (or a timeout message)."""
+    try:
+        segment, _, error = results.get(timeout=5)
+    except Exception:
+        return f"segment workers did not reach the barrier within {BARRIER_TIMEOUT} s"
+    return f"segment worker {segment} failed: {error}"
+
+
+def _segment_worker(config, segment, num_segments, block_names, control_name, barrier, results):
+    """Worker process: run the segment loop; on an error, abort the barrier and report it."""
+    blocks = {name: shared_memory.SharedMemory(name=block_name) for name, block_name in block_names.items()}
+    control_block = shared_memory.SharedMemory(name=control_name)
+    views = {name: block.buf.cast('d') for name, block in blocks.items()}
+    control = control_block.buf.cast('d')
+    try:
+        recorded = _segment_loop(config, segment, num_segments, views, control, barrier)
+        results.put((segment, recorded, None))
+    except threading.BrokenBarrierError:
+        pass   # Aborted by the parent or another worker, which reports the cause
+    except Exception as error:
+        barrier.abort()
+        results.put((segment, None, f"{type(error).__name__}: {error}"))
+    finally:
+        for view in list(views.values()) + [control]:
+            view.release()
+        for block in list(blocks.values()) + [control_block]:
+            block.close()
+
+
+def _segment_loop(config, segment, num_segments, views, control, barrier):
+    """Worker loop: update the vehicles of one road segment, phase by phase; returns the recorded states."""
+    position = views["position"]
+    speed = views["speed"]
+    speed_previous = views["speed_previous"]
+    acceleration = views["acceleration"]
+    v0 = views["v0"]
+    noise = views["noise"]
+    influenced = views["influenced"]
+
+    # Constants
+    road_length = config.road_length
+    speed_limit = config.speed_limit
+    s0 = config.idm_minimum_spacing
+    T = config.idm_safety_time_headway
+    a_max = config.idm_acceleration
+    b_desired = config.idm_desired_deceleration
+    L = config.vehicle_length
+    dt = config.simulation_time_step
+    scheme = config.integration_scheme
+
+    # Locally recorded states: vehicle index, t, position, speed, acceleration
+    recorded = ([], [], [], [], [])
+    record_k, record_t, record_x, record_v, record_a = recorded
+
+    while True:
+        barrier.wait(BARRIER_TIMEOUT)
+        if control[_CONTROL_STOP]:
+            return recorded
+
+        t = control[_CONTROL_TIME]
+        start = int(control[_CONTROL_CUTS + segment])
+        end = int(control[_CONTROL_CUTS + segment + 1])
+
+        # Own vehicles: an even share of the exited vehicles, then the segment
+        exited = int(control[_CONTROL_EXITED])
+        exited_range = range(exited * segment // num_segments, exited * (segment + 1) // num_segments)
+        own = (exited_range, range(start, end))
+
+        # Phase 1: bottleneck check and acceleration (reads the leader's state from the last step)
+        for k in chain(*own):
+            if influenced[k]:
+                x = position[k]
+                in_x_range = (x >= config.bottleneck_x_start and x <= config.bottleneck_x_end)
+                in_t_range = (t >= config.bottleneck_t_start and t <= config.bottleneck_t_end)
+                v0[k] = config.bottleneck_speed_limit if in_x_range and in_t_range else speed_limit
+
+            if k == 0:
+                v_front, s = speed_limit, position[k] + 1e6 - position[k] - L
+            else:
+                v_front, s = speed[k - 1], position[k - 1] - position[k] - L
+            acceleration[k] = idm_acceleration(s, speed[k], v_front, v0[k], noise[k],
+                                               s0, T, a_max, b_desired)
+        barrier.wait(BARRIER_TIMEOUT)
+
+        # Phase 2: speed (reads the leader's position from the last step)
+        for k in chain(*own):
+            speed_previous[k] = speed[k]
+            front_position = None if k == 0 else position[k - 1]
+            speed[k] = next_speed(position[k], speed[k], acceleration[k] * dt, front_position,
+                                  road_length, L, dt)
+        barrier.wait(BARRIER_TIMEOUT)
+
+        # Phase 3: position
+        for k in chain(*own):
+            position[k] = position[k] + displacement(scheme, speed_previous[k], speed[k],
+                                                     acceleration[k], dt)
+        barrier.wait(BARRIER_TIMEOUT)
+
+        # Phase 4: record own vehicles
+        for k in chain(*own):
+            record_k.append(k)
+            record_t.append(t)
+            record_x.append(position[k])
+            record_v.append(speed[k])
+            record_a.append(acceleration[k])
+        barrier.wait(BARRIER_TIMEOUT)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from simulator import Simulator
+
+    # Wall time of the reference engine vs. the decomposed engine per segment count
+    config = Config(1, 3)
+    start = time.perf_counter()
+    Simulator(config, verbose=False).run()
+    reference = time.perf_counter() - start
+    print(f"{mp.cpu_count()} CPUs; reference: {reference:.2f} s")
+
+    counts = [int(n) for n in sys.argv[1:]] or sorted({1, 2, 4, mp.cpu_count()})
+    for num_segments in counts:
+        start = time.perf_counter()
+        DecomposedSimulator(config, num_segments, verbose=False).run()
+        elapsed = time.perf_counter() - start
+        print(f"{num_segments:>3} segments: {elapsed:.2f} s (speedup {reference / elapsed:.2f}x)")
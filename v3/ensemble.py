@@ -0,0 +1,279 @@
+"""
+Streaming ensemble statistics.
+
+Each replication is reduced to a time-space speed grid and a few scalar
+metrics, folded into the accumulators and then discarded, so memory does not
+grow with the number of runs. The wave count uses a point detector emulated
+through the run's SpaceTimeIndex (spacetime.py). Accumulators:
+    WelfordAccumulator:   mean / variance per grid cell (or scalar)
+    HistogramAccumulator: fixed-bin histogram per grid cell, approximate quantiles
+    P2Quantile:           P² quantile sketch for scalar metrics (5 markers)
+"""
+import numpy as np
+
+
+class WelfordAccumulator:
+    """Running mean and variance (Welford); NaN entries are skipped per cell."""
+
+    def __init__(self, shape=()):
+        self.count = np.zeros(shape, dtype=np.int64)
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+
+        self.count += valid
+        delta = np.where(valid, values - self._mean, 0.0)
+        self._mean += np.divide(delta, self.count, out=np.zeros_like(delta), where=valid)
+        self._m2 += np.where(valid, delta * (values - self._mean), 0.0)
+
+
+    @property
+    def mean(self):
+        return np.where(self.count > 0, self._mean, np.nan)
+
+
+    @property
+    def variance(self):
+        """Sample variance (NaN with fewer than two values)."""
+        return np.divide(self._m2, self.count - 1, out=np.full(self._m2.shape, np.nan),
+                         where=self.count > 1)
+
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+
+class HistogramAccumulator:
+    """Histogram with fixed bin edges per cell; quantiles interpolated within bins."""
+
+    def __init__(self, edges, shape=()):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(tuple(shape) + (len(self.edges) - 1,), dtype=np.int64)
+
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        bins = np.clip(np.searchsorted(self.edges, values, side="right") - 1, 0, len(self.edges) - 2)
+
+        cells = np.nonzero(valid)
+        np.add.at(self.counts, cells + (bins[cells],), 1)
+
+
+    def quantile(self, q):
+        """Approximate q-quantile per cell (NaN for empty cells)."""
+        cumulative = np.cumsum(self.counts, axis=-1)
+        total = cumulative[..., -1]
+        target = q * total
+
+        # First bin whose cumulative count reaches the target
+        k = np.argmax(cumulative >= target[..., None], axis=-1)
+        below = np.where(k > 0, np.take_along_axis(cumulative, np.maximum(k - 1, 0)[..., None], -1)[..., 0], 0)
+        in_bin = np.take_along_axis(self.counts, k[..., None], -1)[..., 0]
+        fraction = np.divide(target - below, in_bin, out=np.zeros(target.shape), where=in_bin > 0)
+
+        value = self.edges[k] + fraction * (self.edges[k + 1] - self.edges[k])
+        return np.where(total > 0, value, np.nan)
+
+
+class P2Quantile:
+    """P² streaming estimate of one quantile (Jain & Chlamtac, 1985)."""
+
+    def __init__(self, q):
+        self.q = q
+        self._initial = []
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._increments = np.array([0, q / 2, q, (1 + q) / 2, 1])
+
+
+    def add(self, x):
+        if self._heights is None:
+            self._initial.append(float(x))
+            if len(self._initial) == 5:
+                self._heights = np.sort(self._initial)
+                self._positions = np.arange(1.0, 6.0)
+                self._desired = 1 + 4 * self._increments
+            return
+
+        h = self._heights
+        n = self._positions
+
+        # Cell of x, extending the extremes
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = int(np.searchsorted(h, x, side="right")) - 1
+
+        n[k + 1:] += 1
+        self._desired += self._increments
+
+        # Adjust the three middle markers
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+                )
+                if h[i - 1] < parabolic < h[i + 1]:
+                    h[i] = parabolic
+                else:
+                    h[i] = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+
+    @property
+    def value(self):
+        if self._heights is not None:
+            return float(self._heights[2])
+        if not self._initial:
+            return float("nan")
+        return float(np.quantile(self._initial, self.q))
+
+
+class ScalarStatistics:
+    """Mean, standard deviation and quantile sketches of one scalar metric."""
+
+    def __init__(self, quantiles=(0.05, 0.5, 0.95)):
+        self.moments = WelfordAccumulator()
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
+
+
+    def add(self, value):
+        self.moments.add(value)
+        for sketch in self.quantiles.values():
+            sketch.add(value)
+
+
+    def summary(self):
+        summary = {"count": int(self.moments.count), "mean": float(self.moments.mean),
+                   "std": float(self.moments.std)}
+        for q, sketch in self.quantiles.items():
+            summary[f"q{q:g}"] = sketch.value
+        return summary
+
+
+# ===== Per-run reductions =====
+def speed_grid(trajectories, t_edges, x_edges):
+    """Mean speed per (time, position) cell of one run; NaN for empty cells."""
+    columns = trajectories.columns
+    t, x, v = columns["t"], columns["position"], columns["speed"]
+    counts, _, _ = np.histogram2d(t, x, bins=(t_edges, x_edges))
+    sums, _, _ = np.histogram2d(t, x, bins=(t_edges, x_edges), weights=v)
+    return np.divide(sums, counts, out=np.full(counts.shape, np.nan), where=counts > 0)
+
+
+def count_waves(speeds, threshold):
+    """Number of slow episodes (entries below threshold) in a speed time series; NaN gaps are ignored."""
+    speeds = np.asarray(speeds)
+    speeds = speeds[~np.isnan(speeds)]
+    slow = speeds < threshold
+    return int(np.count_nonzero(slow[1:] & ~slow[:-1]) + (1 if len(slow) and slow[0] else 0))
+
+
+def run_metrics(trajectories, grid, index, t_edges, detector_position, slow_speed):
+    """
+    Scalar metrics of one run: throughput at the road end, flow and wave count
+    at a point detector (slow episodes of the mean speed of the vehicles
+    passing it per time bin, queried from index), mean speed.
+    """
+    metadata = trajectories.metadata
+    road_length = metadata["road_length"]
+    columns = trajectories.columns
+
+    # Vehicles whose last recorded position is beyond the road end
+    last = trajectories.offsets[1:] - 1
+    last = last[last >= trajectories.offsets[:-1]]
+    exited = int(np.count_nonzero(columns["position"][last] >= road_length))
+    duration = columns["t"].max() - columns["t"].min() if len(columns["t"]) else 0
+
+    passages = int(index.detector_counts(detector_position, t_edges).sum())
+    detector_speeds = index.detector_speeds(detector_position, t_edges)
+
+    return {
+        "throughput": exited / duration * 3600 if duration > 0 else float("nan"),
+        "detector_flow": passages / duration * 3600 if duration > 0 else float("nan"),
+        "waves": count_waves(detector_speeds, slow_speed),
+        "mean_speed": float(np.nanmean(grid)),
+    }
+
+
+class EnsembleStatistics:
+    """
+    Streaming statistics over replications of one scenario.
+
+    - Speed grid: per-cell mean/variance and a speed histogram (for quantiles).
+    - Scalars: throughput (veh/h), flow (veh/h) and wave count at the detector, mean speed.
+    """
+
+    def __init__(self, time_max, road_length, time_bin=10, space_bin=50,
+                 speed_edges=np.arange(0, 32, 1.0), detector_position=None, slow_speed=5):
+        self.t_edges = np.arange(0, time_max + time_bin, time_bin)
+        self.x_edges = np.arange(0, road_length + space_bin, space_bin)
+        shape = (len(self.t_edges) - 1, len(self.x_edges) - 1)
+
+        self.detector_position = detector_position if detector_position is not None else road_length / 2
+        self.slow_speed = slow_speed
+
+        self.grid = WelfordAccumulator(shape)
+        self.grid_histogram = HistogramAccumulator(speed_edges, shape)
+        self.scalars = {}
+        self.runs = 0
+
+
+    def add(self, trajectories):
+        """Fold one replication into the statistics."""
+        from spacetime import SpaceTimeIndex
+
+        grid = speed_grid(trajectories, self.t_edges, self.x_edges)
+        self.grid.add(grid)
+        self.grid_histogram.add(grid)
+
+        index = SpaceTimeIndex.build(trajectories)
+        metrics = run_metrics(trajectories, grid, index, self.t_edges, self.detector_position, self.slow_speed)
+        for name, value in metrics.items():
+            self.scalars.setdefault(name, ScalarStatistics()).add(value)
+        self.runs += 1
+
+
+    def summary(self):
+        return {name: statistics.summary() for name, statistics in self.scalars.items()}
+
+
+    def save(self, path):
+        """Save grid statistics (mean, std, 5/50/95 % quantiles) to an .npz file."""
+        np.savez(path, t_edges=self.t_edges, x_edges=self.x_edges, runs=self.runs,
+                 mean=self.grid.mean, std=self.grid.std,
+                 q05=self.grid_histogram.quantile(0.05), q50=self.grid_histogram.quantile(0.5),
+                 q95=self.grid_histogram.quantile(0.95))
+
+
+def run_ensemble(seeds, experiment=3, overrides=None, processes=None, **statistics_options):
+    """Run one replication per seed in a process pool and fold results in as they complete."""
+    from config import Config
+    from transport import imap_results
+
+    overrides = overrides or {}
+    config = Config(seeds[0], experiment, **overrides)
+    options = {"detector_position": config.bottleneck_x_start - 300}
+    options.update(statistics_options)
+    statistics = EnsembleStatistics(config.time_max, config.road_length, **options)
+
+    tasks = [(seed, experiment, overrides) for seed in seeds]
+    for result in imap_results(tasks, processes):
+        with result:
+            statistics.add(result.trajectories)
+
+    return statistics
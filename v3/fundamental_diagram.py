@@ -0,0 +1,202 @@
+"""
+Fundamental diagram (flow-density relation) of the IDM parameters in a Config.
+
+- Analytic: homogeneous equilibrium, a = 0 with Δv = 0, i.e. the gap
+      s_e(v) = (s0 + v*T) / sqrt(1 - (v/v0)^4)
+  inverted for v by vectorized bisection over the whole density grid.
+- Simulated: all densities run at once as independent ring roads (one flat
+  NumPy state, periodic leaders) with the v3 update rules and perception
+  noise; flow is density times the mean speed after a warm-up.
+
+Both are cached per parameter set (analytic in memory, simulated in memory
+and optionally as .npz files in a cache directory).
+
+Units: density veh/km, speed m/s, flow veh/h.
+"""
+import functools
+import hashlib
+import json
+import os
+import numpy as np
+from idm import idm_acceleration_array, next_speed_array
+
+
+class FundamentalDiagram:
+    """Flow-density points with capacity and critical density."""
+
+    def __init__(self, density, speed, flow):
+        self.density = density
+        self.speed = speed
+        self.flow = flow
+
+
+    @property
+    def capacity(self):
+        """Maximum flow (veh/h)."""
+        return float(np.max(self.flow))
+
+
+    @property
+    def critical_density(self):
+        """Density at maximum flow (veh/km)."""
+        return float(self.density[np.argmax(self.flow)])
+
+
+def equilibrium_parameters(config):
+    """Parameters the equilibrium depends on: (v0, s0, T, a, b, L)."""
+    return (config.speed_limit, config.idm_minimum_spacing, config.idm_safety_time_headway,
+            config.idm_acceleration, config.idm_desired_deceleration, config.vehicle_length)
+
+
+def density_grid(parameters, count=400):
+    """Densities from 1 veh/km up to jam density 1000/(s0 + L)."""
+    _, s0, _, _, _, L = parameters
+    return np.linspace(1, 1000 / (s0 + L), count)
+
+
+# ===== Analytic equilibrium =====
+def equilibrium_gap(v, v0, s0, T):
+    """Equilibrium net gap (m) for speed v (m/s); infinite at v >= v0."""
+    v = np.asarray(v, dtype=float)
+    ratio = np.clip(1 - (v / v0) ** 4, 0, None)
+    with np.errstate(divide="ignore"):
+        return (s0 + v * T) / np.sqrt(ratio)
+
+
+def equilibrium_speed(s, v0, s0, T, iterations=50):
+    """Equilibrium speed (m/s) for net gaps s (m), by bisection on [0, v0] for all gaps at once."""
+    s = np.asarray(s, dtype=float)
+    low = np.zeros_like(s)
+    high = np.full_like(s, float(v0))
+
+    # s_e(v) increases monotonically, so halve the bracket towards s_e(v) = s
+    for _ in range(iterations):
+        middle = 0.5 * (low + high)
+        below = equilibrium_gap(middle, v0, s0, T) < s
+        low = np.where(below, middle, low)
+        high = np.where(below, high, middle)
+
+    return np.where(s > s0, 0.5 * (low + high), 0.0)
+
+
+@functools.lru_cache(maxsize=64)
+def _analytic(parameters, densities):
+    v0, s0, T, _, _, L = parameters
+    density = np.array(densities)
+    gap = 1000 / density - L
+    speed = equilibrium_speed(gap, v0, s0, T)
+    flow = density * speed * 3.6
+
+    for array in (density, speed, flow):
+        array.flags.writeable = False
+    return FundamentalDiagram(density, speed, flow)
+
+
+def analytic_fundamental_diagram(config, densities=None):
+    """Equilibrium fundamental diagram of the Config's IDM parameters (cached per parameter set)."""
+    parameters = equilibrium_parameters(config)
+    if densities is None:
+        densities = density_grid(parameters)
+    return _analytic(parameters, tuple(float(d) for d in densities))
+
+
+# ===== Simulated (ring roads) =====
+_simulated_cache = {}
+
+
+def _ring_roads(parameters, densities, ring_length, noise, delta_t, warmup, duration, seed):
+    """Run one ring road per density in a single vectorized loop; mean speed per ring."""
+    v0, s0, T, a_max, b_desired, L = parameters
+    rng = np.random.default_rng(seed)
+
+    counts = np.maximum(np.rint(np.asarray(densities) * ring_length / 1000).astype(int), 1)
+    ring = np.repeat(np.arange(len(counts)), counts)
+    first = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    index = np.arange(len(ring)) - first[ring]
+
+    # Equally spaced vehicles at equilibrium speed; leader is the next vehicle on the same ring
+    spacing = ring_length / counts
+    position = index * spacing[ring]
+    speed = equilibrium_speed(spacing - L, v0, s0, T)[ring]
+    leader = np.where(index == counts[ring] - 1, first[ring], np.arange(len(ring)) + 1)
+
+    warmup_steps = int(round(warmup / delta_t))
+    steps = warmup_steps + int(round(duration / delta_t))
+    speed_sum = np.zeros(len(counts))
+
+    for step in range(steps):
+        gap = (position[leader] - position) % ring_length - L
+        gap[counts[ring] == 1] = ring_length - L
+        perceived = rng.normal(0, noise, len(ring)) if noise != 0 else 0
+
+        a = idm_acceleration_array(gap, speed, speed[leader], v0, perceived, s0, T, a_max, b_desired)
+        speed = next_speed_array(speed, a * delta_t, gap, delta_t)
+        position = (position + np.maximum(speed * delta_t + 0.5 * a * delta_t ** 2, 0)) % ring_length
+
+        if step >= warmup_steps:
+            speed_sum += np.bincount(ring, weights=speed, minlength=len(counts))
+
+    mean_speed = speed_sum / counts / (steps - warmup_steps)
+    return counts * 1000 / ring_length, mean_speed
+
+
+def simulated_fundamental_diagram(config, densities=None, ring_length=None, warmup=300, duration=300,
+                                  noise=None, cache_dir=None):
+    """
+    Fundamental diagram from ring-road simulations at fixed densities.
+
+    - ring_length: ring circumference (m), default config.road_length
+    - warmup / duration: discarded and measured simulated time (s)
+    - noise: perception noise σ, default config.relative_speed_noise
+    - cache_dir: directory for .npz results keyed by parameters and options
+
+    Densities are rounded to whole vehicles per ring.
+    """
+    parameters = equilibrium_parameters(config)
+    if densities is None:
+        densities = np.linspace(5, 1000 / (parameters[1] + parameters[5]), 40)
+    ring_length = ring_length or config.road_length
+    noise = config.relative_speed_noise if noise is None else noise
+
+    options = {
+        "parameters": parameters, "densities": [float(d) for d in densities],
+        "ring_length": ring_length, "noise": noise, "delta_t": config.simulation_time_step,
+        "warmup": warmup, "duration": duration, "seed": config.seed,
+    }
+    key = hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()[:16]
+    if key in _simulated_cache:
+        return _simulated_cache[key]
+
+    path = os.path.join(cache_dir, f"fd_{key}.npz") if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as data:
+            density, speed = data["density"], data["speed"]
+    else:
+        density, speed = _ring_roads(parameters, densities, ring_length, noise,
+                                     config.simulation_time_step, warmup, duration, config.seed)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.savez(path, density=density, speed=speed)
+
+    diagram = FundamentalDiagram(density, speed, density * speed * 3.6)
+    _simulated_cache[key] = diagram
+    return diagram
+
+
+if __name__ == "__main__":
+    import time
+    from config import Config
+
+    config = Config()
+
+    start = time.perf_counter()
+    analytic = analytic_fundamental_diagram(config)
+    elapsed = time.perf_counter() - start
+    print(f"analytic:  capacity {analytic.capacity:7.1f} veh/h at {analytic.critical_density:5.1f} veh/km "
+          f"({elapsed * 1000:.1f} ms)")
+
+    start = time.perf_counter()
+    simulated = simulated_fundamental_diagram(config)
+    elapsed = time.perf_counter() - start
+    print(f"simulated: capacity {simulated.capacity:7.1f} veh/h at {simulated.critical_density:5.1f} veh/km "
+          f"({elapsed:.1f} s)")
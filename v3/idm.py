@@ -0,0 +1,38 @@
+"""
+Vectorized IDM for NumPy arrays.
+
+Element-wise counterparts of vehicle.idm_acceleration and vehicle.next_speed
+(same additional constraints), for code that advances many vehicles at once.
+"""
+import numpy as np
+
+
+def idm_acceleration_array(s, v, v_front, v0, noise, s0, T, a_max, b_desired):
+    """IDM acceleration for arrays of net gaps s, speeds v and leader speeds v_front (with constraints)."""
+    v_delta_perceived = v - v_front + noise
+
+    s = np.maximum(s, 0.1)  # [additional constraint]
+
+    # Desired dynamical gap s*
+    s_star = s0 + np.maximum(0, T * v + v * v_delta_perceived / (2 * np.sqrt(a_max * b_desired)))
+
+    a = a_max * (1 - (v / v0) ** 4 - (s_star / s) ** 2)
+
+    return np.clip(a, -b_desired, a_max)  # [additional constraint]
+
+
+def next_speed_array(speed, dv, gap, delta_t):
+    """Speeds after increments dv, limited by the net gap to the leader (gap=inf for a free road)."""
+    v_max_allowed = np.maximum(gap, 0.01) / delta_t  # [additional constraint]
+    return np.maximum(np.minimum(speed + dv, v_max_allowed), 0)
+
+
+
+def safe_gap(v, v_front, s0, b_desired):
+    """Net gap at which a follower at speed v, braking at b_desired, stays s0 behind a leader at constant v_front."""
+    return s0 + np.maximum(v - v_front, 0) ** 2 / (2 * b_desired)
+
+
+def safe_speed(s, v_front, s0, b_desired):
+    """Largest follower speed for which the net gap s is safe (inverse of safe_gap; s >= s0)."""
+    return v_front + np.sqrt(2 * b_desired * np.maximum(s - s0, 0))
@@ -0,0 +1,351 @@
+"""
+Local asynchronous simulation job server.
+
+Clients send JSON lines over a localhost TCP socket:
+    {"op": "submit", "client": "alice", "seed": 1, "experiment": 3, "overrides": {"idm_acceleration": 1.2}}
+    {"op": "status"}
+and receive JSON-line events on the same connection:
+    {"event": "accepted", "job": KEY, "status": "queued" | "running" | "done"}
+    {"event": "progress", "job": KEY, "t": 350.0}
+    {"event": "done", "job": KEY, "path": ".../KEY.npz", "summary": {...}}
+    {"event": "failed", "job": KEY, "error": "..."}
+
+- Jobs are keyed by the sha256 of the full resolved Config and the engine
+  version (a hash of the simulation modules' source), so identical
+  scenarios (also when spelled differently) share one run: a job already
+  queued or running gains a subscriber, a finished one is answered from the
+  results directory. Results of an older engine are not served.
+- Every client has its own FIFO queue; free workers take jobs from the
+  client queues in round-robin, so one client's batch cannot starve others.
+- At most max_queue jobs wait overall. A submit beyond that is not
+  acknowledged until a slot frees up, which holds back the client.
+- Runs execute in a ProcessPoolExecutor. Progress comes back through a
+  manager queue fed by a Simulator subscriber, and results are saved as
+  Trajectories .npz files (plus a JSON summary) named by the job key.
+  The pool's workers are started before the server listens, so no worker
+  inherits (and keeps open) a client connection.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import os
+from collections import deque
+
+DEFAULT_PORT = 8765
+
+# Modules whose source determines simulation results
+ENGINE_MODULES = ("config", "simulator", "vehicle", "monitors", "accounting", "trajectories")
+
+
+@functools.lru_cache(maxsize=None)
+def engine_version():
+    """sha256 of the source of the engine modules."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in ENGINE_MODULES:
+        with open(os.path.join(directory, f"{name}.py"), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def job_key(seed, experiment, overrides):
+    """sha256 of the resolved Config fields of a scenario and the engine version."""
+    from config import Config
+    from trajectories import config_fields
+
+    fields = config_fields(Config(seed, experiment, **overrides))
+    fields = {name: float(value) if type(value) is int else value for name, value in fields.items()}   # 100 == 100.0
+    fields["engine_version"] = engine_version()
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def _simulate(key, seed, experiment, overrides, path, progress, every):
+    """Worker process: run one scenario, save its trajectories and return the summary."""
+    from config import Config
+    from simulator import Simulator
+    from trajectories import Trajectories
+
+    config = Config(seed, experiment, **overrides)
+    sim = Simulator(config, verbose=False)
+    if progress is not None:
+        sim.subscribe(lambda sim, step, t: progress.put((key, round(t, 3))), every)
+    sim.run()
+
+    temporary = path + ".partial.npz"
+    Trajectories.from_vehicles(sim.vehicles, config).save(temporary)
+    os.replace(temporary, path)
+
+    summary = {"vehicles": len(sim.vehicles), "inflow_rate": sim.inflow_rate,
+               "health": [f"{event.action}:{event.monitor}" for event in sim.health_events]}
+    summary.update(sim.travel_times.summary())
+    return summary
+
+
+class Job:
+
+    def __init__(self, key, client, spec):
+        self.key = key
+        self.client = client
+        self.spec = spec
+        self.status = "queued"
+        self.result = None
+        self.finished = asyncio.Event()
+        self.subscribers = set()   # asyncio queues of connected clients waiting for this job
+
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+    def finish(self, status, result):
+        self.status = status
+        self.result = result
+        self.finished.set()
+        self.publish(result)
+
+
+class JobServer:
+
+    def __init__(self, results_dir, workers=None, max_queue=64, progress_every=1000):
+        """
+        - results_dir:    directory for <key>.npz results and <key>.json summaries
+        - workers:        simulation processes (default: CPU count)
+        - max_queue:      jobs waiting overall before submits are held back
+        - progress_every: steps between progress events of a run
+        """
+        self.results_dir = results_dir
+        self.workers = workers or os.cpu_count()
+        self.max_queue = max_queue
+        self.progress_every = progress_every
+
+        self.jobs = {}
+        self.queues = {}          # client -> deque of queued jobs
+        self.turns = deque()      # clients with queued jobs, in round-robin order
+
+
+    # ===== Lifecycle =====
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """Serve until cancelled."""
+        import multiprocessing as mp
+        from concurrent.futures import ProcessPoolExecutor
+
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.max_queue)
+        self.free_workers = asyncio.Semaphore(self.workers)
+        self.queued = asyncio.Condition()
+
+        manager = mp.Manager()
+        self.progress = manager.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        await asyncio.gather(*(self.loop.run_in_executor(self.pool, os.getpid) for _ in range(self.workers)))
+        tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._forward_progress())]
+
+        server = await asyncio.start_server(self._handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.progress.put(None)
+            self.pool.shutdown(cancel_futures=True)
+            manager.shutdown()
+
+
+    # ===== Connections =====
+    async def _handle(self, reader, writer):
+        events = asyncio.Queue()
+        sender = asyncio.create_task(self._send(events, writer))
+        watched = []
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as error:
+                    events.put_nowait({"event": "error", "error": f"invalid JSON: {error}"})
+                    continue
+
+                if request.get("op") == "status":
+                    events.put_nowait(self._status())
+                elif request.get("op") == "submit":
+                    try:
+                        job = await self._submit(request)
+                    except (TypeError, ValueError) as error:
+                        events.put_nowait({"event": "failed", "job": None, "error": str(error)})
+                        continue
+                    job.subscribers.add(events)
+                    watched.append(job)
+                    events.put_nowait({"event": "accepted", "job": job.key, "status": job.status})
+                    if job.result is not None:
+                        events.put_nowait(job.result)
+                else:
+                    events.put_nowait({"event": "error", "error": f"unknown op: {request.get('op')!r}"})
+
+            # Client finished sending: deliver the remaining results, then close
+            # (or stop early if the connection breaks and the sender fails)
+            delivered = asyncio.create_task(self._deliver(watched, events))
+            await asyncio.wait({delivered, sender}, return_when=asyncio.FIRST_COMPLETED)
+            delivered.cancel()
+        except ConnectionError:
+            pass
+        finally:
+            for job in watched:
+                job.subscribers.discard(events)
+            sender.cancel()
+            writer.close()
+
+
+    async def _deliver(self, jobs, events):
+        for job in jobs:
+            await job.finished.wait()
+        await events.join()
+
+
+    async def _send(self, events, writer):
+        try:
+            while True:
+                event = await events.get()
+                writer.write(json.dumps(event).encode() + b"\n")
+                await writer.drain()
+                events.task_done()
+        except ConnectionError:
+            pass   # Client gone; _handle stops waiting on this connection
+
+
+    def _status(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts.setdefault(job.client, {}).setdefault(job.status, 0)
+            counts[job.client][job.status] += 1
+        return {"event": "status", "workers": self.workers, "clients": counts}
+
+
+    # ===== Jobs =====
+    async def _submit(self, request):
+        """Job for a submit request (existing or new); raises TypeError/ValueError for an invalid scenario."""
+        client = str(request.get("client", "anonymous"))
+        seed = request.get("seed", 1)
+        experiment = request.get("experiment", 3)
+        overrides = request.get("overrides", {})
+        key = job_key(seed, experiment, overrides)
+
+        # Deduplicate: in flight or finished in this session, or finished earlier on disk
+        if key in self.jobs:
+            return self.jobs[key]
+        job = Job(key, client, (seed, experiment, overrides))
+        path, summary_path = self._paths(key)
+        if os.path.exists(path) and os.path.exists(summary_path):
+            with open(summary_path) as f:
+                job.finish("done", {"event": "done", "job": key, "path": path, "summary": json.load(f)})
+            self.jobs[key] = job
+            return job
+
+        # Bounded queue: wait for a slot before the job is registered
+        self.jobs[key] = job
+        await self.slots.acquire()
+        async with self.queued:
+            if client not in self.queues or not self.queues[client]:
+                self.queues.setdefault(client, deque())
+                self.turns.append(client)
+            self.queues[client].append(job)
+            self.queued.notify()
+        return job
+
+
+    def _paths(self, key):
+        base = os.path.join(self.results_dir, key)
+        return base + ".npz", base + ".json"
+
+
+    async def _next_job(self):
+        """Next job in round-robin over clients with queued jobs."""
+        async with self.queued:
+            await self.queued.wait_for(lambda: self.turns)
+            client = self.turns.popleft()
+            job = self.queues[client].popleft()
+            if self.queues[client]:
+                self.turns.append(client)
+            return job
+
+
+    async def _dispatch(self):
+        while True:
+            await self.free_workers.acquire()
+            job = await self._next_job()
+            self.slots.release()
+
+            job.status = "running"
+            job.publish({"event": "running", "job": job.key})
+            path, _ = self._paths(job.key)
+            future = self.loop.run_in_executor(self.pool, _simulate, job.key, *job.spec, path,
+                                               self.progress, self.progress_every)
+            future.add_done_callback(lambda future, job=job: self._finish(job, future))
+
+
+    def _finish(self, job, future):
+        self.free_workers.release()
+        path, summary_path = self._paths(job.key)
+        try:
+            summary = future.result()
+        except Exception as error:
+            del self.jobs[job.key]   # a later submit retries
+            job.finish("failed", {"event": "failed", "job": job.key, "error": f"{type(error).__name__}: {error}"})
+        else:
+            with open(summary_path, "w") as f:
+                json.dump(summary, f)
+            job.finish("done", {"event": "done", "job": job.key, "path": path, "summary": summary})
+
+
+    async def _forward_progress(self):
+        while True:
+            item = await asyncio.to_thread(self.progress.get)
+            if item is None:
+                return
+            key, t = item
+            job = self.jobs.get(key)
+            if job is not None:
+                job.publish({"event": "progress", "job": key, "t": t})
+
+
+# ===== Client =====
+def submit(specs, host="127.0.0.1", port=DEFAULT_PORT, client=None, on_event=None):
+    """
+    Submit scenarios and wait for their results (blocking; usable from notebooks).
+
+    specs: dicts with seed, experiment and overrides. Returns {job key: final
+    event} with the result path and summary of each job (specs of the same
+    scenario share one job); on_event(event) is called for every event
+    received (e.g. progress).
+    """
+    import getpass
+    import socket
+
+    client = client or getpass.getuser()
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile("rwb")
+        for spec in specs:
+            stream.write(json.dumps(dict(spec, op="submit", client=client)).encode() + b"\n")
+        stream.flush()
+        connection.shutdown(socket.SHUT_WR)
+
+        # Every spec is answered by "accepted" (or "failed" without a job when
+        # invalid); done once all are answered and every accepted job finished
+        results, jobs, answered = {}, set(), 0
+        for line in stream:
+            event = json.loads(line)
+            if on_event is not None:
+                on_event(event)
+            if event["event"] == "accepted":
+                jobs.add(event["job"])
+                answered += 1
+            elif event["event"] == "failed" and event.get("job") is None:
+                answered += 1
+            if event["event"] in ("done", "failed"):
+                results.setdefault(event.get("job"), event)
+            if answered == len(specs) and jobs <= results.keys():
+                break
+        return results
+
@@ -0,0 +1,143 @@
+"""
+Live time-space view of a running simulation.
+
+LiveView subscribes to a Simulator and, every `every` steps, bins the
+current vehicle speeds by position into one new column of a rolling speed
+raster. Only that column is computed per update. Redrawing uses matplotlib
+blitting (the axes background is cached, only the image artist is redrawn)
+and is skipped whenever the time spent in the view would exceed `overhead`
+times the wall time of the run, so display cost stays a bounded fraction of
+the simulation. Rendering happens on the main thread (matplotlib GUIs are not
+thread-safe) but never waits for the screen.
+
+Press "q" or close the window to stop the run (Simulator.request_stop).
+"""
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+class LiveView:
+
+    def __init__(self, config, every=10, space_bin=20, window=None, overhead=0.05):
+        """
+        - every:     steps between raster columns (and render attempts)
+        - space_bin: raster cell length (m)
+        - window:    visible time span (s); default: the whole run
+        - overhead:  maximum share of wall time spent in the view
+        """
+        self.config = config
+        self.every = every
+        self.overhead = overhead
+
+        dt_column = every * config.simulation_time_step
+        window = window or config.time_max
+        self.x_edges = np.arange(0, config.road_length + space_bin, space_bin)
+        self.columns = max(1, int(round(window / dt_column)))
+        self.raster = np.full((len(self.x_edges) - 1, self.columns), np.nan)
+        self.column = 0
+        self.t_last = 0
+
+        # Time accounting for the overhead budget
+        self.time_spent = 0.0
+        self.render_cost = 0.0
+        self.frames = 0
+        self.start = None
+
+        self.sim = None
+        self.fig = None
+
+
+    def attach(self, sim):
+        """Subscribe to a simulator and open the window."""
+        self.sim = sim
+        sim.subscribe(self.update, self.every)
+        self._setup_figure()
+
+
+    def _setup_figure(self):
+        config = self.config
+        plt.ion()
+        self.fig, self.ax = plt.subplots(figsize=(10, 5))
+        window = self.columns * self.every * config.simulation_time_step
+
+        self.image = self.ax.imshow(
+            self.raster, origin="lower", aspect="auto", cmap="jet_r",
+            vmin=0, vmax=config.speed_limit, interpolation="nearest",
+            extent=(0, window, 0, config.road_length), animated=True,
+        )
+        self.fig.colorbar(self.image, ax=self.ax, label="Speed (m/s)")
+        self.ax.axhspan(config.bottleneck_x_start, config.bottleneck_x_end, color="k", alpha=0.1)
+        self.ax.set_xlabel("Time in window (s)")
+        self.ax.set_ylabel("Position (m)")
+        self.ax.set_title("Live time-space diagram")
+
+        self.fig.canvas.mpl_connect("key_press_event", self._on_key)
+        self.fig.canvas.mpl_connect("close_event", self._on_close)
+
+        # Cache the static background for blitting
+        self.fig.canvas.draw()
+        self.background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        plt.show(block=False)
+
+
+    def update(self, sim, step, t):
+        """Subscriber callback: add one raster column and render if within budget."""
+        start = time.perf_counter()
+        if self.start is None:
+            self.start = start
+
+        # Current speeds binned by position (vehicles beyond the road end are dropped)
+        positions = np.fromiter((vehicle.position for vehicle in sim.vehicles), float, len(sim.vehicles))
+        speeds = np.fromiter((vehicle.speed for vehicle in sim.vehicles), float, len(sim.vehicles))
+        cells = np.searchsorted(self.x_edges, positions, side="right") - 1
+        on_road = (cells >= 0) & (cells < len(self.x_edges) - 1)
+        counts = np.bincount(cells[on_road], minlength=len(self.x_edges) - 1)
+        sums = np.bincount(cells[on_road], weights=speeds[on_road], minlength=len(self.x_edges) - 1)
+
+        # Rolling window: once full, shift left by one column
+        if self.column >= self.columns:
+            self.raster[:, :-1] = self.raster[:, 1:]
+            self.column = self.columns - 1
+        self.raster[:, self.column] = np.divide(sums, counts, out=np.full(len(counts), np.nan),
+                                                where=counts > 0)
+        self.column += 1
+        self.t_last = t
+
+        # Render only if the view stays within its share of the wall time
+        # (the first frame is always drawn; later ones use the last frame's cost)
+        elapsed = time.perf_counter() - self.start
+        if self.fig is not None and self.time_spent + self.render_cost <= self.overhead * elapsed:
+            render_start = time.perf_counter()
+            self._render()
+            self.render_cost = time.perf_counter() - render_start
+
+        self.time_spent += time.perf_counter() - start
+
+
+    def _render(self):
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        self.image.set_data(self.raster)
+        self.ax.draw_artist(self.image)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
+        self.frames += 1
+
+
+    def report(self):
+        """Frames drawn and measured share of wall time spent in the view."""
+        elapsed = time.perf_counter() - self.start if self.start else 0
+        share = self.time_spent / elapsed if elapsed > 0 else 0.0
+        return {"frames": self.frames, "overhead": share, "t": self.t_last}
+
+
+    def _on_key(self, event):
+        if event.key == "q" and self.sim is not None:
+            self.sim.request_stop("stopped from live view")
+
+
+    def _on_close(self, event):
+        self.fig = None
+        if self.sim is not None:
+            self.sim.request_stop("live view closed")
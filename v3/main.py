@@ -1,6 +1,5 @@
 from config import Config
 from simulator import Simulator
-from plotting import plot_time_space_diagram
 
 
 def main():
@@ -14,9 +13,10 @@ def main():
     # Run the simulation loop
     sim.run()
 
-    # Generate the time–space diagram
+    # Generate the time–space diagram (matplotlib is only loaded here)
+    from plotting import plot_time_space_diagram
     plot_time_space_diagram(sim, config)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,153 @@
+"""
+Online run-health monitors for Simulator.run.
+
+Each monitor is checked every config.health_check_interval seconds and may
+raise a HealthEvent once per run. What happens then depends on its action:
+    "abort":    stop the run (Simulator.aborted is set to the event)
+    "flag":     record the event in Simulator.health_events and continue
+    "continue": monitor disabled
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+
+HEALTH_ACTIONS = ("abort", "flag", "continue")
+
+
+class HealthEvent:
+
+    def __init__(self, monitor, action, t, message):
+        self.monitor = monitor
+        self.action = action
+        self.t = t
+        self.message = message
+
+    def __repr__(self):
+        return f"HealthEvent({self.monitor!r}, {self.action!r}, t={self.t:.1f}, {self.message!r})"
+
+
+class HealthMonitor(ABC):
+    """Base class: subclasses implement check(vehicles, t) -> message or None."""
+
+    name = "monitor"
+
+    def __init__(self, config, action):
+        if action not in HEALTH_ACTIONS:
+            raise ValueError(f"Unknown health action for {self.name}: {action!r}")
+        self.config = config
+        self.action = action
+        self.triggered = False
+
+
+    def update(self, vehicles, t):
+        """Run the check once; returns a HealthEvent the first time the monitor triggers."""
+        if self.triggered or self.action == "continue":
+            return None
+
+        message = self.check(vehicles, t)
+        if message is None:
+            return None
+
+        self.triggered = True
+        return HealthEvent(self.name, self.action, t, message)
+
+
+    @abstractmethod
+    def check(self, vehicles, t):
+        """Message describing the problem, or None if the run is healthy."""
+
+
+class UpstreamBreakdownMonitor(HealthMonitor):
+    """Traffic breaks down upstream of the bottleneck before the bottleneck is active."""
+
+    name = "upstream_breakdown"
+
+    def check(self, vehicles, t):
+        config = self.config
+        if t >= config.bottleneck_t_start:
+            return None
+
+        for vehicle in vehicles:
+            if vehicle.position < config.bottleneck_x_start and vehicle.speed < config.breakdown_speed:
+                return (f"vehicle {vehicle.id} at {vehicle.position:.0f} m drives "
+                        f"{vehicle.speed:.1f} m/s before the bottleneck is active")
+        return None
+
+
+class ConstraintSaturationMonitor(HealthMonitor):
+    """The minimum-gap constraint (s = max(s, 0.1)) is active too often: near-collisions."""
+
+    name = "constraint_saturation"
+
+    def __init__(self, config, action):
+        super().__init__(config, action)
+        samples = max(1, round(config.saturation_window / config.health_check_interval))
+        self.window = deque(maxlen=samples)
+
+
+    def check(self, vehicles, t):
+        L = self.config.vehicle_length
+        hits = 0
+        count = 0
+        for vehicle in vehicles:
+            front = vehicle.vehicle_front
+            if front is None or vehicle.position >= self.config.road_length:
+                continue
+            count += 1
+            if front.position - vehicle.position - L <= 0.1:
+                hits += 1
+
+        self.window.append((hits, count))
+        if len(self.window) < self.window.maxlen:
+            return None
+
+        total_hits = sum(h for h, _ in self.window)
+        total_count = sum(c for _, c in self.window)
+        if total_count and total_hits / total_count > self.config.saturation_fraction:
+            return (f"gap constraint active in {total_hits / total_count:.1%} of samples "
+                    f"over the last {self.config.saturation_window} s")
+        return None
+
+
+class SteadyStateMonitor(HealthMonitor):
+    """Mean speed on the road is statistically stationary over two consecutive windows."""
+
+    name = "steady_state"
+
+    def __init__(self, config, action):
+        super().__init__(config, action)
+        samples = max(2, round(config.steady_state_window / config.health_check_interval))
+        self.window = deque(maxlen=2 * samples)
+        self.samples = samples
+
+
+    def check(self, vehicles, t):
+        # Only samples after the bottleneck has been switched on (free flow before is not the steady state)
+        if t < self.config.bottleneck_t_start:
+            return None
+
+        speeds = [vehicle.speed for vehicle in vehicles if vehicle.position < self.config.road_length]
+        if not speeds:
+            return None
+        self.window.append(sum(speeds) / len(speeds))
+        if len(self.window) < self.window.maxlen:
+            return None
+
+        values = list(self.window)
+        first, second = values[:self.samples], values[self.samples:]
+        mean_first = sum(first) / len(first)
+        mean_second = sum(second) / len(second)
+
+        if mean_first > 0 and abs(mean_second - mean_first) / mean_first < self.config.steady_state_tolerance:
+            return (f"mean speed stationary at {mean_second:.1f} m/s "
+                    f"over 2 x {self.config.steady_state_window} s")
+        return None
+
+
+def build_monitors(config):
+    """Monitors configured in config (disabled ones are left out)."""
+    monitors = [
+        UpstreamBreakdownMonitor(config, config.breakdown_action),
+        ConstraintSaturationMonitor(config, config.saturation_action),
+        SteadyStateMonitor(config, config.steady_state_action),
+    ]
+    return [monitor for monitor in monitors if monitor.action != "continue"]
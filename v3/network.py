@@ -0,0 +1,411 @@
+"""
+Road networks of single-lane links joined at merge and diverge nodes.
+
+- Link: vehicles in NumPy columns ordered downstream first, stored in the
+  slots [head, tail) of capacity arrays. Vehicles leave at the head and enter
+  at the tail, so moving a vehicle between links copies one row; nothing is
+  rebuilt per step. Capacity doubles (or the live slots are compacted) when
+  the tail reaches the end.
+- Merge: a main and a ramp link feeding one outgoing link. The last
+  lane_length metres of the ramp are an acceleration lane alongside the
+  main link: a ramp vehicle there is at the main position with the same
+  distance to the node. The ramp's head vehicle merges by gap acceptance,
+  decided once per node per step, and is inserted into the main link at
+  that position, so every main vehicle behind it follows it from then on.
+  Its lead is the nearest main vehicle ahead (else the last vehicle on the
+  outgoing link), its lag the nearest main vehicle behind. Both gaps must
+  be safe for the follower: braking at b (the IDM deceleration limit) it
+  stays s0 behind, so a slow ramp vehicle is not accepted in front of
+  fast main traffic. In the lane ramp vehicles speed up towards the main
+  speed limit, no faster than lets them stop at its end, where they see a
+  stop line (the node) until they merge.
+- Diverge: one incoming link split over several outgoing links by fixed
+  fractions; each vehicle's route is fixed at creation.
+- Source: inflow at the start of a link (min interval + exponential extra, as
+  in the Simulator). A vehicle enters once the net gap is at least s0, at
+  the highest speed that is safe behind the last vehicle.
+
+A step computes all accelerations from the current state (leaders across
+nodes included), then advances speeds and positions with the v3 Euler update
+and constraints (idm.py), then transfers vehicles past link ends. Every
+stage is vectorized per link, so the cost is linear in the number of
+vehicles on the network. Random numbers (inflow, routes, perception noise)
+come from a NumPy generator seeded with config.seed.
+"""
+import numpy as np
+from idm import idm_acceleration_array, next_speed_array, safe_gap, safe_speed
+
+_COLUMNS = (("id", np.int64), ("position", float), ("speed", float),
+            ("acceleration", float), ("route", float))
+
+FREE_ROAD = 1e6   # Distance to the leader of a vehicle with a free road ahead (m)
+
+
+class Link:
+
+    def __init__(self, name, length, speed_limit, capacity=64):
+        self.name = name
+        self.length = length
+        self.speed_limit = speed_limit
+        self.downstream = None   # Node at the end of the link (None: vehicles leave the network)
+
+        self.head = 0
+        self.tail = 0
+        self.data = {name: np.zeros(capacity, dtype=dtype) for name, dtype in _COLUMNS}
+
+
+    def __len__(self):
+        return self.tail - self.head
+
+
+    def column(self, name):
+        """View of a column for the vehicles on the link, downstream first."""
+        return self.data[name][self.head:self.tail]
+
+
+    def speed_limits(self, s0, b):
+        """Desired speed of each vehicle on the link (the node may raise it near the end)."""
+        limits = np.full(len(self), float(self.speed_limit))
+        if self.downstream is not None:
+            self.downstream.adjust_speed_limits(self, limits, s0, b)
+        return limits
+
+
+    def last(self):
+        """(rear position, speed) of the most upstream vehicle, or None if the link is empty."""
+        if self.tail == self.head:
+            return None
+        k = self.tail - 1
+        return self.data["position"][k], self.data["speed"][k]
+
+
+    def push(self, rows):
+        """Append vehicles (dict of equally long columns, downstream first) at the tail."""
+        n = len(rows["id"])
+        if n == 0:
+            return
+        capacity = len(self.data["id"])
+        if self.tail + n > capacity:
+            live = self.tail - self.head
+            if live + n > capacity // 2:
+                capacity = max(2 * capacity, live + n)
+            for name, column in self.data.items():
+                resized = np.zeros(capacity, dtype=column.dtype)
+                resized[:live] = column[self.head:self.tail]
+                self.data[name] = resized
+            self.head, self.tail = 0, live
+
+        for name, column in self.data.items():
+            column[self.tail:self.tail + n] = rows[name]
+        self.tail += n
+
+
+    def insert(self, index, rows):
+        """Insert vehicles (dict of equally long columns) before the index-th vehicle on the link."""
+        n = len(rows["id"])
+        self.push(rows)
+        k = self.head + index
+        for column in self.data.values():
+            column[k:self.tail] = np.roll(column[k:self.tail], n)
+
+
+    def pop(self, n):
+        """Remove the n head vehicles; returns their columns (copies)."""
+        rows = {name: column[self.head:self.head + n].copy() for name, column in self.data.items()}
+        self.head += n
+        return rows
+
+
+# ===== Nodes =====
+class Merge:
+    """Main and ramp link merging into out; ramp vehicles change onto main from an acceleration lane."""
+
+    def __init__(self, main, ramp, out, lane_length=None, accept_gap=None, accept_deceleration=None):
+        self.main, self.ramp, self.out = main, ramp, out
+        main.downstream = ramp.downstream = self
+        self.lane_length = min(ramp.length, main.length) if lane_length is None else lane_length
+        self.accept_gap = accept_gap
+        self.accept_deceleration = accept_deceleration
+        self.merges = 0
+
+
+    def decide(self, network):
+        """Gap acceptance of the ramp's head vehicle for this step; an accepted vehicle moves onto main."""
+        if len(self.ramp) == 0:
+            return
+        s0 = network.s0 if self.accept_gap is None else self.accept_gap
+        b = network.b_desired if self.accept_deceleration is None else self.accept_deceleration
+        L = network.L
+
+        offset = self.ramp.length - self.ramp.column("position")[0]   # Distance to the node
+        if offset > self.lane_length:
+            return
+        position = self.main.length - offset
+        speed = self.ramp.column("speed")[0]
+
+        # Main vehicles head first; [0, k) are ahead of the ramp vehicle
+        x = self.main.column("position")
+        main_speed = self.main.column("speed")
+        k = int(np.searchsorted(-x, -position))
+
+        if k > 0:
+            lead_gap, lead_speed = x[k - 1] - L - position, main_speed[k - 1]
+        else:
+            rear, lead_speed = _rear_of(self.out, L)
+            lead_gap = offset + rear
+        if lead_gap < safe_gap(speed, lead_speed, s0, b):
+            return
+        if k < len(x) and position - L - x[k] < safe_gap(main_speed[k], speed, s0, b):
+            return
+
+        rows = self.ramp.pop(1)
+        rows["position"][:] = position
+        self.main.insert(k, rows)
+        self.merges += 1
+
+
+    def leader(self, network, link, route):
+        """(distance from the node to the leader's rear, leader speed) for the head vehicle of link."""
+        if link is self.ramp:
+            return 0.0, 0.0   # Stop line at the end of the acceleration lane
+        return _rear_of(self.out, network.L)
+
+
+    def adjust_speed_limits(self, link, limits, s0, b):
+        """Ramp vehicles in the acceleration lane aim for the main speed limit, as far as they can stop at its end."""
+        if link is self.ramp:
+            offset = link.length - link.column("position")
+            in_lane = offset <= self.lane_length
+            limits[in_lane] = np.clip(safe_speed(offset[in_lane], 0, s0, b), link.speed_limit, self.main.speed_limit)
+
+
+    def target(self, link, route):
+        return self.out
+
+
+class Diverge:
+    """Incoming link split over outs by fractions (vehicle route u in [0, 1) picks the out link)."""
+
+    def __init__(self, inflow, outs, fractions):
+        self.inflow = inflow
+        self.outs = list(outs)
+        self.bounds = np.cumsum(fractions) / np.sum(fractions)
+        inflow.downstream = self
+
+
+    def decide(self, network):
+        pass
+
+
+    def leader(self, network, link, route):
+        return _rear_of(self.target(link, route), network.L)
+
+
+    def adjust_speed_limits(self, link, limits, s0, b):
+        pass
+
+
+    def target(self, link, route):
+        return self.outs[min(int(np.searchsorted(self.bounds, route, side="right")), len(self.outs) - 1)]
+
+
+def _rear_of(link, L):
+    """Rear position and speed of the most upstream vehicle of link (free road if empty)."""
+    last = link.last()
+    if last is None:
+        return FREE_ROAD, link.speed_limit
+    return last[0] - L, last[1]
+
+
+class Source:
+    """Inflow at the start of a link: min_interval + exponential(extra_interval) between vehicles."""
+
+    def __init__(self, link, min_interval, extra_interval=0):
+        self.link = link
+        self.min_interval = min_interval
+        self.extra_interval = extra_interval
+        self.next_time = None
+        self.waiting = 0    # Arrived vehicles queued at a blocked entrance
+
+
+# ===== Network =====
+class Network:
+
+    def __init__(self, config, links, nodes=(), sources=()):
+        self.config = config
+        self.links = list(links)
+        self.nodes = list(nodes)
+        self.sources = list(sources)
+        self.rng = np.random.default_rng(config.seed)
+
+        self.s0 = config.idm_minimum_spacing
+        self.T = config.idm_safety_time_headway
+        self.b_desired = config.idm_desired_deceleration
+        self.L = config.vehicle_length
+        self.dt = config.simulation_time_step
+
+        self.number_of_vehicles = 0
+        self.exits = {"id": [], "t": []}
+        self.history = []   # Per step: (t, {link name: (ids, positions, speeds)}) when recording
+
+
+    def _generate(self, t):
+        """Arrivals of all sources; at most one vehicle enters per source and step, when the entrance is free."""
+        for source in self.sources:
+            if source.next_time is None:
+                source.next_time = t + self._interval(source)
+            while source.next_time <= t:
+                source.waiting += 1
+                source.next_time += self._interval(source)
+
+            last = source.link.last()
+            if source.waiting == 0 or (last is not None and last[0] - self.L < self.s0):
+                continue
+
+            speed = min(self.config.initial_speed, source.link.speed_limit)
+            if last is not None:
+                speed = min(speed, float(safe_speed(last[0] - self.L, last[1], self.s0, self.b_desired)))
+
+            source.waiting -= 1
+            self.number_of_vehicles += 1
+            source.link.push({"id": [self.number_of_vehicles], "position": [0.0], "speed": [speed],
+                              "acceleration": [0.0], "route": self.rng.random(1)})
+
+
+    def _interval(self, source):
+        extra = self.rng.exponential(source.extra_interval) if source.extra_interval > 0 else 0
+        return source.min_interval + extra
+
+
+    def step(self, t):
+        """Advance the network by one time step."""
+        config = self.config
+        dt, L = self.dt, self.L
+        sigma = config.relative_speed_noise
+
+        self._generate(t)
+        for node in self.nodes:
+            node.decide(self)
+
+        # 1. Accelerations from the current state (leaders across nodes included)
+        updates = []
+        for link in self.links:
+            n = len(link)
+            if n == 0:
+                continue
+            x, v = link.column("position"), link.column("speed")
+
+            gap = np.empty(n)
+            leader_speed = np.empty(n)
+            gap[1:] = x[:-1] - x[1:] - L
+            leader_speed[1:] = v[:-1]
+            if link.downstream is None:
+                gap[0], leader_speed[0] = FREE_ROAD, link.speed_limit
+            else:
+                ahead, speed = link.downstream.leader(self, link, link.column("route")[0])
+                gap[0] = link.length - x[0] + ahead
+                leader_speed[0] = speed
+
+            noise = self.rng.normal(0, sigma, n) if sigma != 0 else 0
+            a = idm_acceleration_array(gap, v, leader_speed, link.speed_limits(self.s0, self.b_desired), noise,
+                                       self.s0, self.T, config.idm_acceleration, config.idm_desired_deceleration)
+            updates.append((link, gap, a))
+
+        # 2. Speeds and positions (Euler update with the v3 constraints)
+        for link, gap, a in updates:
+            x, v = link.column("position"), link.column("speed")
+            v[:] = next_speed_array(v, a * dt, gap, dt)
+            x += np.maximum(v * dt + 0.5 * a * dt ** 2, 0)
+            link.column("acceleration")[:] = a
+
+        # 3. Transfers past link ends (head first, so order on the next link is preserved);
+        #    ramp vehicles leave only by merging and stay behind the stop line
+        for link in self.links:
+            x = link.column("position")
+            node = link.downstream
+            if isinstance(node, Merge) and link is node.ramp:
+                np.minimum(x, link.length, out=x)
+                continue
+            n = int(np.searchsorted(-x, -link.length, side="right"))
+            if n == 0:
+                continue
+            if node is None:
+                rows = link.pop(n)
+                self.exits["id"].extend(rows["id"].tolist())
+                self.exits["t"].extend([t] * n)
+                continue
+
+            for _ in range(n):
+                target = node.target(link, link.column("route")[0])
+                rows = link.pop(1)
+                rows["position"] -= link.length
+                target.push(rows)
+
+
+    def record(self, t):
+        self.history.append((t, {link.name: (link.column("id").copy(), link.column("position").copy(),
+                                             link.column("speed").copy()) for link in self.links}))
+
+
+    def run(self, time_max=None, record=False):
+        """Simulate from t = 1 to time_max (default config.time_max)."""
+        time_max = time_max or self.config.time_max
+        num_steps = int((time_max - 1) / self.dt) + 1
+        for i in range(num_steps):
+            t = 1 + i * self.dt
+            self.step(t)
+            if record:
+                self.record(t)
+
+
+    def vehicles_on_network(self):
+        return sum(len(link) for link in self.links)
+
+
+    def ramp_queue(self):
+        """Vehicles on merge ramps or waiting to enter them (ramp demand not yet served)."""
+        ramps = {node.ramp for node in self.nodes if isinstance(node, Merge)}
+        return (sum(len(ramp) for ramp in ramps)
+                + sum(source.waiting for source in self.sources if source.link in ramps))
+
+
+def corridor(config, segments=4, segment_length=1000, ramp_length=300, lane_length=200, ramp_interval=12,
+             off_ramp_fraction=0.1):
+    """
+    Mainline of `segments` links; an on-ramp (ending in a lane_length m
+    acceleration lane) merges at every internal node
+    and the last node is an off-ramp diverge taking off_ramp_fraction of the
+    traffic. Mainline inflow follows the config's experiment settings.
+    """
+    v = config.speed_limit
+    main = [Link(f"main_{k}", segment_length, v) for k in range(segments)]
+    links, nodes = list(main), []
+    sources = [Source(main[0], config.vehicle_min_interval, config.vehicle_extra_interval)]
+
+    for k in range(1, segments - 1):
+        ramp = Link(f"ramp_{k}", ramp_length, 0.5 * v)
+        links.append(ramp)
+        nodes.append(Merge(main[k - 1], ramp, main[k], lane_length=lane_length))
+        sources.append(Source(ramp, ramp_interval, ramp_interval))
+
+    exit_ramp = Link("off_ramp", ramp_length, 0.5 * v)
+    links.append(exit_ramp)
+    nodes.append(Diverge(main[-2], [main[-1], exit_ramp], [1 - off_ramp_fraction, off_ramp_fraction]))
+
+    return Network(config, links, nodes, sources)
+
+
+if __name__ == "__main__":
+    import time
+    from config import Config
+
+    config = Config(experiment=2)
+    for segments in (4, 8, 16):
+        network = corridor(config, segments=segments)
+        start = time.perf_counter()
+        network.run(time_max=601)
+        elapsed = time.perf_counter() - start
+        merges = [node for node in network.nodes if isinstance(node, Merge)]
+        print(f"{segments:>3} segments: {network.vehicles_on_network():>4} on network, "
+              f"{len(network.exits['id']):>5} exited, {sum(node.merges for node in merges):>4} merges, "
+              f"{network.ramp_queue():>3} queued on ramps, {elapsed:.2f} s")
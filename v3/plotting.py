@@ -1,9 +1,27 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.collections import LineCollection
+from trajectories import Trajectories
 
 
-def plot_time_space_diagram(sim, config):
+def plot_time_space_diagram(sim, config, output=None, index=None, window=None):
+    """
+    Time-space diagram colored by speed.
+
+    - sim is a simulator (vehicles with history) or a Trajectories object.
+    - index: SpaceTimeIndex of the trajectories (built if not given); the
+      drawn samples come from its window query.
+    - window: (x_min, x_max, t_min, t_max) to draw only part of the diagram.
+    - output: save the figure to this path instead of showing it.
+    """
+    from spacetime import SpaceTimeIndex
+
+    if isinstance(sim, Trajectories):
+        trajectories = sim
+    else:
+        trajectories = Trajectories.from_vehicles(sim.vehicles)
+    if index is None:
+        index = SpaceTimeIndex.build(trajectories)
 
     fig, ax = plt.subplots(figsize=(10, 6))
 
@@ -14,41 +32,31 @@ def plot_time_space_diagram(sim, config):
         vmax=getattr(config, 'speed_limit', None) or 1  # fallback if speed_limit missing
     )
 
-    any_segments = False
-
     # ----------------------------------------------------------------------
-    # Loop through every vehicle and draw its trajectory
+    # Draw all trajectories as one line collection: samples inside the window
+    # (vehicle-major), joined where consecutive samples belong to one vehicle
     # ----------------------------------------------------------------------
-    for vehicle in sim.vehicles:
-        history = getattr(vehicle, 'history', None)
-
-        # Need at least two records to draw a line segment
-        if not history or len(history) < 2:
-            continue
-
-        # Extract time, position, speed histories as arrays
-        times = np.array([record['t'] for record in history], dtype=float)
-        positions = np.array([record['position'] for record in history], dtype=float)
-        speeds = np.array([record['speed'] for record in history], dtype=float)
-
-        # Build piecewise line segments between consecutive points
-        points = np.vstack([times, positions]).T.reshape(-1, 1, 2)
-        segments = np.concatenate([points[:-1], points[1:]], axis=1)
-
-        # Speed for each segment (average of endpoints)
-        seg_speeds = 0.5 * (speeds[:-1] + speeds[1:])
-
-        # Create line collection colored by speed
-        lc = LineCollection(
-            segments,
-            cmap=cmap,
-            norm=norm,
-            linewidths=1.5
-        )
-        lc.set_array(seg_speeds)
-        ax.add_collection(lc)
+    columns = trajectories.columns
+    bounds = window or (0, index.road_length, index.t0, np.max(columns['t']))
+    rows = np.sort(index.window(*bounds, rows=True))
+    vehicles = index.vehicle_of(rows)
+    joined = (rows[1:] == rows[:-1] + 1) & (vehicles[1:] == vehicles[:-1])
+    start, end = rows[:-1][joined], rows[1:][joined]
+
+    points = np.stack([columns['t'], columns['position']], axis=1)
+    segments = np.stack([points[start], points[end]], axis=1)
+
+    # Create line collection colored by speed (average of the segment's endpoints)
+    lc = LineCollection(
+        segments,
+        cmap=cmap,
+        norm=norm,
+        linewidths=1.5
+    )
+    lc.set_array(0.5 * (columns['speed'][start] + columns['speed'][end]))
+    ax.add_collection(lc)
 
-        any_segments = True
+    any_segments = len(segments) > 0
 
     # ----------------------------------------------------------------------
     # Add a colorbar only if any vehicle produced drawable segments
@@ -61,25 +69,21 @@ def plot_time_space_diagram(sim, config):
     # ----------------------------------------------------------------------
     # Set axis limits
     # ----------------------------------------------------------------------
-    # Time axis: use config.time_max if available, otherwise max recorded time
-    ax.set_xlim(
-        0,
-        getattr(
-            config,
-            'time_max',
-            max((rec['t'] for v in sim.vehicles for rec in getattr(v, 'history', [{'t': 0}])) )
+    if window is not None:
+        ax.set_xlim(window[2], window[3])
+        ax.set_ylim(window[0], window[1])
+    else:
+        # Time axis: use config.time_max if available, otherwise max recorded time
+        ax.set_xlim(
+            0,
+            getattr(config, 'time_max', None) or np.max(trajectories.columns['t'], initial=0)
         )
-    )
 
-    # Position axis: use config.road_length if available, otherwise max recorded position
-    ax.set_ylim(
-        0,
-        getattr(
-            config,
-            'road_length',
-            max((rec['position'] for v in sim.vehicles for rec in getattr(v, 'history', [{'position': 0}])) )
+        # Position axis: use config.road_length if available, otherwise max recorded position
+        ax.set_ylim(
+            0,
+            getattr(config, 'road_length', None) or np.max(trajectories.columns['position'], initial=0)
         )
-    )
 
     # ----------------------------------------------------------------------
     # Plot reference line of wave speed
@@ -92,7 +96,7 @@ def plot_time_space_diagram(sim, config):
 
     x_text = 100
     y_text = y0 + slope * (x_text - x0)
-    ax.text(x_text, y_text, '-16 km/h', color='white', fontsize=10, va='bottom', ha='left')          
+    ax.text(x_text, y_text, '-16 km/h', color='white', fontsize=10, va='bottom', ha='left', clip_on=True)          
     
 
     # ----------------------------------------------------------------------
@@ -104,4 +108,8 @@ def plot_time_space_diagram(sim, config):
     ax.grid(True, linestyle='--', alpha=0.4)
 
     plt.tight_layout()
-    plt.show()
+    if output is None:
+        plt.show()
+    else:
+        fig.savefig(output, dpi=150)
+        plt.close(fig)
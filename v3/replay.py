@@ -0,0 +1,232 @@
+"""
+Replay of recorded (empirical) trajectories.
+
+- load_recording: reads a CSV with columns vehicle_id, t, position, speed
+  (header required, other columns ignored). The first load converts it to a
+  cache directory of .npy columns next to the file; later loads memory-map
+  those, so large recordings are not parsed or held in memory again.
+- ReplayLeader: stands in for the head vehicle's leader (vehicle_front),
+  interpolating the recorded position and speed at each step.
+- replay_platoon: a Simulator whose vehicles start at the recorded state of
+  a platoon, with inflow disabled and the first vehicle driven from data.
+- platoon_errors: RMSE of gap and speed of the simulated followers against
+  the recording, on the simulation time grid.
+"""
+import copy
+import json
+import os
+import numpy as np
+from trajectories import Trajectories
+
+RECORDING_COLUMNS = ("vehicle_id", "t", "position", "speed")
+
+
+def _convert(csv_path, cache_dir):
+    """Parse the CSV once and write sorted .npy columns with CSR vehicle offsets."""
+    with open(csv_path) as f:
+        header = [name.strip() for name in f.readline().split(",")]
+    missing = [name for name in RECORDING_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"{csv_path}: missing columns {', '.join(missing)}")
+
+    data = np.loadtxt(csv_path, delimiter=",", skiprows=1, ndmin=2,
+                      usecols=[header.index(name) for name in RECORDING_COLUMNS])
+    vehicle, t = data[:, 0].astype(np.int64), data[:, 1]
+    order = np.lexsort((t, vehicle))
+
+    vehicle_ids, counts = np.unique(vehicle[order], return_counts=True)
+    offsets = np.zeros(len(vehicle_ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.save(os.path.join(cache_dir, "vehicle_ids.npy"), vehicle_ids)
+    np.save(os.path.join(cache_dir, "offsets.npy"), offsets)
+    for column, name in enumerate(RECORDING_COLUMNS[1:], start=1):
+        np.save(os.path.join(cache_dir, f"{name}.npy"), np.ascontiguousarray(data[order, column]))
+
+    stat = os.stat(csv_path)
+    with open(os.path.join(cache_dir, "source.json"), "w") as f:
+        json.dump({"path": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime}, f)
+
+
+def load_recording(csv_path, cache_dir=None):
+    """
+    Recorded trajectories as Trajectories (columns t, position, speed; memory-mapped).
+
+    The cache (default: <csv_path>.cache) is rebuilt when the CSV changes.
+    """
+    cache_dir = cache_dir or csv_path + ".cache"
+    source = os.path.join(cache_dir, "source.json")
+
+    stat = os.stat(csv_path)
+    fresh = False
+    if os.path.exists(source):
+        with open(source) as f:
+            recorded = json.load(f)
+        fresh = recorded["size"] == stat.st_size and recorded["mtime"] == stat.st_mtime
+    if not fresh:
+        _convert(csv_path, cache_dir)
+
+    def column(name):
+        return np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r")
+
+    columns = {name: column(name) for name in RECORDING_COLUMNS[1:]}
+    return Trajectories(np.load(os.path.join(cache_dir, "vehicle_ids.npy")),
+                        np.load(os.path.join(cache_dir, "offsets.npy")),
+                        columns, {"source": os.path.abspath(csv_path)})
+
+
+class ReplayLeader:
+    """
+    Leader driven by a recorded trajectory; used as vehicle_front of the head vehicle.
+
+    Simulation time t maps to recording time t + time_offset. Before the
+    recording starts the first sample is held; after it ends the vehicle
+    continues at its last recorded speed.
+    """
+
+    def __init__(self, times, positions, speeds, time_offset=0.0, id=0):
+        self.id = id
+        self.times = np.asarray(times, dtype=float)
+        self.positions = np.asarray(positions, dtype=float)
+        self.speeds = np.asarray(speeds, dtype=float)
+        self.time_offset = time_offset
+        self.vehicle_front = None
+
+        self.position = float(self.positions[0])
+        self.speed = float(self.speeds[0])
+        self._cursor = 0
+
+
+    @classmethod
+    def from_recording(cls, recording, k, time_offset=0.0):
+        """Leader replaying the k-th vehicle of a recording."""
+        columns = recording.vehicle(k)
+        return cls(columns["t"], columns["position"], columns["speed"], time_offset,
+                   int(recording.vehicle_ids[k]))
+
+
+    def update(self, t):
+        """Set position and speed for simulation time t (amortized O(1) for increasing t)."""
+        t = t + self.time_offset
+        times = self.times
+        last = len(times) - 1
+
+        if t <= times[0]:
+            self._cursor = 0
+            self.position, self.speed = float(self.positions[0]), float(self.speeds[0])
+            return
+        if t >= times[last]:
+            self.speed = float(self.speeds[last])
+            self.position = float(self.positions[last]) + self.speed * (t - times[last])
+            return
+
+        # Advance the cursor to the interval [times[k], times[k + 1]) containing t
+        k = self._cursor
+        if times[k] > t:
+            k = int(np.searchsorted(times, t, side="right")) - 1
+        while times[k + 1] <= t:
+            k += 1
+        self._cursor = k
+
+        w = (t - times[k]) / (times[k + 1] - times[k])
+        self.position = float(self.positions[k] + w * (self.positions[k + 1] - self.positions[k]))
+        self.speed = float(self.speeds[k] + w * (self.speeds[k + 1] - self.speeds[k]))
+
+
+# ===== Platoon replay =====
+def platoon_order(recording, vehicles=None):
+    """Recording indices of a platoon, front to back (by position at the latest common start time)."""
+    vehicles = np.arange(len(recording)) if vehicles is None else np.asarray(vehicles)
+    offsets, columns = recording.offsets, recording.columns
+    t_start = columns["t"][offsets[vehicles]].max()
+    positions = [np.interp(t_start, *(columns[name][offsets[k]:offsets[k + 1]] for name in ("t", "position")))
+                 for k in vehicles]
+    return vehicles[np.argsort(positions)[::-1]]
+
+
+def replay_platoon(recording, config, vehicles=None):
+    """
+    Simulator for a recorded platoon: the first vehicle replays its recording,
+    the followers start from their recorded state and follow the IDM.
+
+    vehicles are recording indices (default: all, ordered by platoon_order).
+    The run covers the time all of them are recorded. The simulator gets a
+    copy of config with inflow and the bottleneck disabled (errors then
+    measure the car-following fit only) and time_max/road_length adjusted
+    to the recording; the caller's config is not modified.
+    Returns (sim, order, t_start).
+    """
+    from simulator import Simulator
+    from vehicle import Vehicle
+
+    order = platoon_order(recording, vehicles)
+    offsets, columns = recording.offsets, recording.columns
+    t_start = float(columns["t"][offsets[order]].max())
+    t_end = float(columns["t"][offsets[order + 1] - 1].min())
+
+    config = copy.copy(config)
+    config.percentage_influenced_by_bottleneck = 0
+    config.vehicle_min_interval = float("inf")
+    config.vehicle_extra_interval = 0
+    config.time_max = 1 + (t_end - t_start)
+    leader_end = float(columns["position"][offsets[order[0] + 1] - 1])
+    config.road_length = max(config.road_length, leader_end + 1e3)
+
+    sim = Simulator(config, verbose=False)
+    sim.leader = ReplayLeader.from_recording(recording, order[0], time_offset=t_start - 1)
+    sim.leader.update(1)
+
+    front = sim.leader
+    for k in order[1:]:
+        vehicle = Vehicle(config, int(recording.vehicle_ids[k]), front, sim.vehicle_parameters)
+        t, x, v = (columns[name][offsets[k]:offsets[k + 1]] for name in ("t", "position", "speed"))
+        vehicle.position = float(np.interp(t_start, t, x))
+        vehicle.speed = vehicle.speed_previous = float(np.interp(t_start, t, v))
+        vehicle.v0 = config.speed_limit
+        sim.vehicles.append(vehicle)
+        front = vehicle
+
+    return sim, order, t_start
+
+
+def platoon_errors(sim, recording, order, t_start):
+    """
+    RMSE of gap and speed of the simulated followers against the recording.
+
+    Both are sampled on the simulation grid (simulated rows are dense per
+    vehicle, recorded ones are interpolated); gaps use the recorded leader.
+    Returns {"gap": RMSE, "speed": RMSE, "gap_per_vehicle": ..., "speed_per_vehicle": ...}.
+    """
+    simulated = Trajectories.from_vehicles(sim.vehicles)
+    steps = np.diff(simulated.offsets)
+    n = int(steps.min())
+    rows = simulated.offsets[:-1, None] + np.arange(n)
+
+    # The state recorded at simulation time t is one step past recording time t - 1 + t_start
+    dt = sim.config.simulation_time_step
+    t_grid = simulated.columns["t"][rows[0]] - 1 + t_start + dt
+
+    offsets, columns = recording.offsets, recording.columns
+
+    def resample(name):
+        return np.array([np.interp(t_grid, columns["t"][offsets[k]:offsets[k + 1]],
+                                   columns[name][offsets[k]:offsets[k + 1]], left=np.nan, right=np.nan)
+                         for k in order])
+
+    recorded_position, recorded_speed = resample("position"), resample("speed")
+    L = sim.config.vehicle_length
+
+    # Rows: followers; the leader row of the recording is the front of the first follower
+    simulated_position = np.vstack([recorded_position[:1], simulated.columns["position"][rows]])
+    simulated_gap = simulated_position[:-1] - simulated_position[1:] - L
+    recorded_gap = recorded_position[:-1] - recorded_position[1:] - L
+    speed_error = simulated.columns["speed"][rows] - recorded_speed[1:]
+    gap_error = simulated_gap - recorded_gap
+
+    return {
+        "gap": float(np.sqrt(np.nanmean(gap_error ** 2))),
+        "speed": float(np.sqrt(np.nanmean(speed_error ** 2))),
+        "gap_per_vehicle": np.sqrt(np.nanmean(gap_error ** 2, axis=1)),
+        "speed_per_vehicle": np.sqrt(np.nanmean(speed_error ** 2, axis=1)),
+    }
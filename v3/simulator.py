@@ -1,13 +1,58 @@
 import random
 from config import Config
-from vehicle import Vehicle
+from vehicle import Vehicle, VehicleParameters
+from monitors import HealthEvent, build_monitors
+from accounting import TravelTimeAccount
 
 class Simulator:
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, verbose=True):
         self.config = config
+        self.verbose = verbose
         self.vehicles = []
 
+        # Constants shared by all vehicles
+        self.vehicle_parameters = VehicleParameters(config)
+
+        # Run health: events raised by the monitors, and the event that aborted the run
+        self.health_events = []
+        self.aborted = None
+        self.duration = None
+
+        # Entry/exit, travel time, delay and stops of vehicles leaving the road
+        self.travel_times = None
+
+        # Subscribers called every few steps (live views, progress reporting), and stop requests
+        self.subscribers = []
+        self.stop_reason = None
+
+        # Optional leader of the first vehicle with update(t), e.g. replay.ReplayLeader
+        self.leader = None
+
+        # Controllers called every config.control_interval (see controllers.py)
+        self.controllers = []
+
+
+    def subscribe(self, callback, every=1):
+        """Call callback(sim, step, t) every `every` steps during run()."""
+        self.subscribers.append((callback, every))
+
+
+    def add_controller(self, controller):
+        """Call controller.control(t, ids, positions, speeds) every control interval during run()."""
+        self.controllers.append(controller)
+
+
+    @property
+    def inflow_rate(self):
+        """Generated vehicles per hour of simulated time (0 if the run stopped in its first step)."""
+        return int(len(self.vehicles) / self.duration * 3600) if self.duration else 0
+
+
+    def request_stop(self, reason="stop requested"):
+        """Ask the running loop to stop after the current step (e.g. from a subscriber)."""
+        self.stop_reason = reason
+
 
     def run(self):
         """Main simulation loop."""
@@ -17,32 +62,123 @@ class Simulator:
         dt = self.config.simulation_time_step  # e.g., 0.1 seconds
         num_steps = int((self.config.time_max - 1) / dt) + 1
 
+        monitors = build_monitors(self.config)
+        self.travel_times = TravelTimeAccount(self.config)
+        check_every = max(1, round(self.config.health_check_interval / dt))
+        control_every = max(1, round(self.config.control_interval / dt))
+
         for i in range(num_steps):
             t = 1 + i * dt  # simulation time starts at t = 1
 
             # Print every 100 seconds
-            if abs(t % 100) < 1e-6:
+            if self.verbose and abs(t % 100) < 1e-6:
                 print(f"step: {i}, time: {int(t)}")
 
             # 1. Vehicle generation / inflow process
             number_of_vehicles, time_generation_last, self.vehicles = (
                 self._generate_vehicles(number_of_vehicles, t, time_generation_last, self.vehicles)
             )
-            
-            # 2. Apply road/bottleneck speed limits
-            self._check_road(t)
 
-            # 3. Car-following model updates (IDM)
-            self._update_all_acceleration()
-            self._update_all_speed()
-            self._update_all_position()
+            # Externally driven leader of the head vehicle
+            if self.leader is not None:
+                self.leader.update(t)
+
+            # Controllers (vectorized over all vehicles, once per control interval)
+            if self.controllers and i % control_every == 0:
+                self._apply_controllers(t)
+
+            if self.config.integration_scheme == "rk4":
+                # 2. Apply road/bottleneck speed limits
+                self._check_road(t)
+
+                # 3. Car-following model updates (IDM)
+                self._update_all_rk4()
+
+                # 4. Record per-vehicle state at this timestep
+                self._record_all_state(t)
+            else:
+                # 2.-3. Road/bottleneck speed limits and IDM acceleration
+                self._update_all_acceleration(t)
+
+                # 3.-4. Speed and position updates, record state at this timestep
+                self._update_all_motion(t)
+
+            # Travel times of vehicles leaving the road
+            self.travel_times.update(self.vehicles, t)
+
+            # 5. Run health monitors
+            if monitors and i % check_every == 0 and self._check_health(monitors, t):
+                break
+
+            # 6. Notify subscribers
+            for callback, every in self.subscribers:
+                if i % every == 0:
+                    callback(self, i, t)
 
-            # 4. Record per-vehicle state at this timestep
-            self._record_all_state(t)
+            if self.stop_reason is not None:
+                self.aborted = HealthEvent("stop_request", "abort", t, self.stop_reason)
+                self.health_events.append(self.aborted)
+                break
+
+        # Simulated duration (shorter if a monitor aborted the run)
+        self.duration = t - 1 if self.aborted else self.config.time_max - 1
 
         # Print summary after simulation completes
-        print("\nVehicle Number: ", len(self.vehicles))
-        print("Inflow Rate: ", int(len(self.vehicles) / (self.config.time_max - 1) * 3600), " veh/h\n" )
+        if self.verbose:
+            print("\nVehicle Number: ", len(self.vehicles))
+            print("Inflow Rate: ", self.inflow_rate, " veh/h" )
+            summary = self.travel_times.summary()
+            print("Exited Vehicles: ", summary["exited"])
+            print(f"Mean Travel Time: {summary['mean_travel_time']:.1f} s, Mean Delay: {summary['mean_delay']:.1f} s, "
+                  f"Mean Stops: {summary['mean_stops']:.2f}")
+            print("Outflow Rate (last", self.config.outflow_window, "s): ", int(self.travel_times.outflow(t)), " veh/h\n")
+
+
+    def _check_health(self, monitors, t):
+        """Update the run-health monitors; returns True if the run must be aborted."""
+        for monitor in monitors:
+            event = monitor.update(self.vehicles, t)
+            if event is None:
+                continue
+
+            self.health_events.append(event)
+            if self.verbose:
+                print(f"[{event.action}] {event.monitor} at t={t:.1f} s: {event.message}")
+
+            if event.action == "abort":
+                self.aborted = event
+                return True
+
+        return False
+
+
+    def _apply_controllers(self, t):
+        """Call the controllers on state arrays and set the combined caps on the vehicles."""
+        import numpy as np
+
+        vehicles = self.vehicles
+        if not vehicles:
+            return
+
+        n = len(vehicles)
+        ids = np.fromiter((vehicle.id for vehicle in vehicles), np.int64, n)
+        positions = np.fromiter((vehicle.position for vehicle in vehicles), float, n)
+        speeds = np.fromiter((vehicle.speed for vehicle in vehicles), float, n)
+
+        v0_cap = np.full(n, np.nan)
+        a_cap = np.full(n, np.nan)
+        for controller in self.controllers:
+            v0, a = controller.control(t, ids, positions, speeds)
+            if v0 is not None:
+                v0_cap = np.fmin(v0_cap, v0)
+            if a is not None:
+                a_cap = np.fmin(a_cap, a)
+
+        # Only vehicles whose caps are set or released are touched
+        for caps, name in ((v0_cap, "v0_cap"), (a_cap, "a_cap")):
+            previous = np.fromiter((getattr(vehicle, name) is not None for vehicle in vehicles), bool, n)
+            for k in np.flatnonzero(previous | ~np.isnan(caps)):
+                setattr(vehicles[k], name, None if np.isnan(caps[k]) else float(caps[k]))
 
 
     def _check_road(self, current_time):
@@ -51,22 +187,82 @@ class Simulator:
             vehicle.check_road(current_time)
 
 
-    def _update_all_acceleration(self):
-        """Update acceleration of all vehicles using their car-following rules."""
-        for vehicle in self.vehicles:
-            vehicle.update_acceleration()
+    def _update_all_acceleration(self, t=None):
+        """
+        Update acceleration of all vehicles using their car-following rules.
+        Front to back, so perception noise is drawn in vehicle order. With t,
+        each vehicle's bottleneck/speed-limit check is applied in the same pass.
+        """
+        if t is None:
+            for vehicle in self.vehicles:
+                vehicle.update_acceleration()
+        else:
+            for vehicle in self.vehicles:
+                vehicle.check_road(t)
+                vehicle.update_acceleration()
 
 
-    def _update_all_speed(self):
-        """Update speeds of all vehicles."""
-        for vehicle in self.vehicles:
+    def _update_all_motion(self, t):
+        """
+        Update speed and position and record the state of all vehicles in one pass.
+        Back to front: the speed constraint of a vehicle reads the position of
+        its leader, which is only moved later in the pass, exactly as with
+        separate speed and position passes.
+        """
+        for vehicle in reversed(self.vehicles):
             vehicle.update_speed()
+            vehicle.update_position()
+            vehicle.record_state(t)
 
 
-    def _update_all_position(self):
-        """Update positions of all vehicles."""
-        for vehicle in self.vehicles:
-            vehicle.update_position()
+    def _update_all_rk4(self):
+        """Classical RK4 step on the IDM for all vehicles.
+
+        The perception noise is sampled once per vehicle (in the same order as the
+        other schemes) and held constant over the four stages. The safety
+        constraints are applied to the combined increment.
+        """
+        dt = self.config.simulation_time_step
+        vehicles = self.vehicles
+
+        # Stage 1 also samples the noise and sets vehicle.a for recording
+        self._update_all_acceleration()
+        x1 = [vehicle.position for vehicle in vehicles]
+        v1 = [vehicle.speed for vehicle in vehicles]
+        a1 = [vehicle.a for vehicle in vehicles]
+
+        x2 = [x + 0.5 * dt * v for x, v in zip(x1, v1)]
+        v2 = [v + 0.5 * dt * a for v, a in zip(v1, a1)]
+        a2 = self._stage_acceleration(x2, v2)
+
+        x3 = [x + 0.5 * dt * v for x, v in zip(x1, v2)]
+        v3 = [v + 0.5 * dt * a for v, a in zip(v1, a2)]
+        a3 = self._stage_acceleration(x3, v3)
+
+        x4 = [x + dt * v for x, v in zip(x1, v3)]
+        v4 = [v + dt * a for v, a in zip(v1, a3)]
+        a4 = self._stage_acceleration(x4, v4)
+
+        # Speeds first (constraints use the front positions at the start of the step)
+        for k, vehicle in enumerate(vehicles):
+            dv = dt / 6 * (a1[k] + 2 * a2[k] + 2 * a3[k] + a4[k])
+            vehicle.update_speed(dv)
+
+        for k, vehicle in enumerate(vehicles):
+            dx = dt / 6 * (v1[k] + 2 * v2[k] + 2 * v3[k] + v4[k])
+            vehicle.update_position(dx)
+
+
+    def _stage_acceleration(self, positions, speeds):
+        """Accelerations of all vehicles for intermediate RK stage states."""
+        accelerations = []
+        for k, vehicle in enumerate(self.vehicles):
+            if k == 0:
+                a = vehicle.acceleration_at(positions[0], speeds[0])
+            else:
+                a = vehicle.acceleration_at(positions[k], speeds[k], positions[k - 1], speeds[k - 1])
+            accelerations.append(a)
+        return accelerations
 
 
     def _record_all_state(self, t):
@@ -83,8 +279,8 @@ class Simulator:
           an exponential random component (extra_interval).
         - Each new vehicle follows the last generated one (v_front).
         """
-        # Determine the front vehicle (last in list)
-        v_front = vehicles[-1] if vehicles else None
+        # Determine the front vehicle (last in list, or the external leader)
+        v_front = vehicles[-1] if vehicles else self.leader
 
         t_min = self.config.vehicle_min_interval
         extra_interval = self.config.vehicle_extra_interval
@@ -105,7 +301,7 @@ class Simulator:
             number_of_vehicles += 1
 
             # Create the new vehicle
-            v = Vehicle(self.config, number_of_vehicles, v_front)
+            v = Vehicle(self.config, number_of_vehicles, v_front, self.vehicle_parameters)
             vehicles.append(v)
             last_generation_time = self.next_generation_time
 
@@ -0,0 +1,186 @@
+"""
+Space-time index over columnar trajectories.
+
+Built once per run; afterwards queries cost a binary search instead of a
+scan over all rows:
+    time_slice(t)                          rows of all vehicles on the road at t, by position
+    window(x_min, x_max, t_min, t_max)     vehicles inside a space-time window
+    crossing_times(x)                      time each vehicle passes position x
+    detector_counts(x, t_edges)            vehicles passing x per time bin
+    detector_speeds(x, t_edges)            mean speed of the vehicles passing x per time bin
+
+Rows on the road (position < road_length) are ordered by (step, position)
+with per-step offsets; per-vehicle entry and exit steps bound each vehicle's
+presence. Segmented binary searches use composite keys
+(segment * (road_length + 1) + position), so searches over many steps or
+vehicles run as one np.searchsorted call.
+
+The index is saved next to the trajectories file (run.npz -> run.index.npz).
+"""
+import os
+import numpy as np
+
+
+def index_path(path):
+    """Index file stored alongside a trajectories file."""
+    root, extension = os.path.splitext(path)
+    return f"{root}.index{extension or '.npz'}"
+
+
+class SpaceTimeIndex:
+
+    def __init__(self, trajectories, t0, dt, road_length, step_offsets, step_rows, entry_step, exit_step):
+        self.trajectories = trajectories
+        self.t0 = t0
+        self.dt = dt
+        self.road_length = road_length
+        self.step_offsets = step_offsets
+        self.step_rows = step_rows
+        self.entry_step = entry_step
+        self.exit_step = exit_step
+
+        # Composite keys for segmented searches
+        self._span = road_length + 1
+        positions = trajectories.columns["position"]
+        steps = np.repeat(np.arange(len(step_offsets) - 1), np.diff(step_offsets))
+        self._step_keys = steps * self._span + positions[step_rows]
+
+        # On-road rows in vehicle-major order (positions never decrease along a trajectory)
+        self._vehicle_rows = np.sort(step_rows)
+        self._row_vehicle = np.searchsorted(trajectories.offsets, self._vehicle_rows, side="right") - 1
+        self._vehicle_keys = self._row_vehicle * self._span + positions[self._vehicle_rows]
+
+
+    @classmethod
+    def build(cls, trajectories):
+        metadata = trajectories.metadata
+        t = trajectories.columns["t"]
+        x = trajectories.columns["position"]
+        offsets = trajectories.offsets
+
+        dt = metadata.get("simulation_time_step") or float(np.min(np.diff(np.unique(t))))
+        road_length = float(metadata.get("road_length", np.max(x) + 1))
+        t0 = float(t.min())
+        steps = np.rint((t - t0) / dt).astype(np.int64)
+
+        rows = np.flatnonzero(x < road_length)
+        order = np.lexsort((x[rows], steps[rows]))
+        step_rows = rows[order]
+
+        num_steps = int(steps.max()) + 1
+        step_offsets = np.zeros(num_steps + 1, dtype=np.int64)
+        np.cumsum(np.bincount(steps[rows], minlength=num_steps), out=step_offsets[1:])
+
+        # Entry at the first recorded step, exit after the last step on the road
+        vehicles = len(offsets) - 1
+        has_rows = offsets[1:] > offsets[:-1]
+        entry_step = np.where(has_rows, steps[np.minimum(offsets[:-1], len(steps) - 1)], 0)
+        row_vehicle = np.searchsorted(offsets, rows, side="right") - 1
+        exit_step = entry_step + np.bincount(row_vehicle, minlength=vehicles)
+
+        return cls(trajectories, t0, dt, road_length, step_offsets, step_rows, entry_step, exit_step)
+
+
+    @classmethod
+    def load(cls, path, trajectories):
+        """Load an index saved with save() for the given trajectories."""
+        with np.load(path) as data:
+            return cls(trajectories, float(data["t0"]), float(data["dt"]), float(data["road_length"]),
+                       data["step_offsets"], data["step_rows"], data["entry_step"], data["exit_step"])
+
+
+    @classmethod
+    def for_file(cls, path, trajectories=None):
+        """Index of a trajectories file: loaded from index_path(path), or built and saved there."""
+        from trajectories import Trajectories
+
+        trajectories = trajectories if trajectories is not None else Trajectories.load(path)
+        if os.path.exists(index_path(path)) and os.path.getmtime(index_path(path)) >= os.path.getmtime(path):
+            return cls.load(index_path(path), trajectories)
+        index = cls.build(trajectories)
+        index.save(index_path(path))
+        return index
+
+
+    def save(self, path):
+        np.savez(path, t0=self.t0, dt=self.dt, road_length=self.road_length, step_offsets=self.step_offsets,
+                 step_rows=self.step_rows, entry_step=self.entry_step, exit_step=self.exit_step)
+
+
+    # ===== Queries =====
+    def step_of(self, t):
+        """Nearest recorded step of time t (clipped to the run)."""
+        step = np.rint((np.asarray(t, dtype=float) - self.t0) / self.dt).astype(np.int64)
+        return np.clip(step, 0, len(self.step_offsets) - 2)
+
+
+    def vehicle_of(self, rows):
+        """Vehicle index (into the trajectories) of each row."""
+        return np.searchsorted(self.trajectories.offsets, rows, side="right") - 1
+
+
+    def time_slice(self, t):
+        """Rows of all vehicles on the road at time t, ordered by position."""
+        step = int(self.step_of(t))
+        return self.step_rows[self.step_offsets[step]:self.step_offsets[step + 1]]
+
+
+    def window(self, x_min, x_max, t_min, t_max, rows=False):
+        """
+        Vehicles (indices, ascending) with a sample inside [x_min, x_max] x [t_min, t_max];
+        rows=True returns the matching rows instead.
+        """
+        steps = np.arange(self.step_of(t_min), self.step_of(t_max) + 1)
+        lower = np.searchsorted(self._step_keys, steps * self._span + max(x_min, 0), side="left")
+        upper = np.searchsorted(self._step_keys, steps * self._span + min(x_max, self.road_length), side="right")
+
+        # Concatenate the row ranges [lower, upper) of all steps without a Python loop
+        # (empty where the window misses the road or is inverted)
+        lengths = np.maximum(upper - lower, 0)
+        starts = np.repeat(lower - np.cumsum(lengths) + lengths, lengths)
+        matched = self.step_rows[starts + np.arange(lengths.sum())]
+        return matched if rows else np.unique(self.vehicle_of(matched))
+
+
+    def crossing_times(self, x):
+        """Time each vehicle first reaches position x (interpolated; NaN if it never does on the road)."""
+        return self.crossings(x)[0]
+
+
+    def crossings(self, x):
+        """(time, speed) of each vehicle when it first reaches position x (interpolated; NaN if it never does)."""
+        t = self.trajectories.columns["t"]
+        speed = self.trajectories.columns["speed"]
+        positions = self.trajectories.columns["position"]
+        vehicles = np.arange(len(self.trajectories))
+
+        k = np.searchsorted(self._vehicle_keys, vehicles * self._span + x, side="left")
+        inside = k < len(self._vehicle_keys)
+        k = np.minimum(k, len(self._vehicle_keys) - 1)
+        valid = inside & (self._row_vehicle[k] == vehicles)
+
+        # Interpolate between the previous row of the same vehicle and the first row at or beyond x
+        row = self._vehicle_rows[k]
+        first = row == self.trajectories.offsets[vehicles]
+        previous = np.where(first, row, row - 1)
+        x0, x1 = positions[previous], positions[row]
+        w = np.clip(np.divide(x - x0, x1 - x0, out=np.ones(len(row)), where=x1 > x0), 0, 1)
+        times = t[previous] + w * (t[row] - t[previous])
+        speeds = speed[previous] + w * (speed[row] - speed[previous])
+        return np.where(valid, times, np.nan), np.where(valid, speeds, np.nan)
+
+
+    def detector_counts(self, x, t_edges):
+        """Number of vehicles passing position x in each time bin (loop detector emulation)."""
+        times = self.crossing_times(x)
+        counts, _ = np.histogram(times[~np.isnan(times)], bins=t_edges)
+        return counts
+
+
+    def detector_speeds(self, x, t_edges):
+        """Mean speed of the vehicles passing position x in each time bin (NaN for bins without passages)."""
+        times, speeds = self.crossings(x)
+        passed = ~np.isnan(times)
+        counts, _ = np.histogram(times[passed], bins=t_edges)
+        sums, _ = np.histogram(times[passed], bins=t_edges, weights=speeds[passed])
+        return np.divide(sums, counts, out=np.full(len(counts), np.nan), where=counts > 0)
@@ -0,0 +1,152 @@
+"""
+Linear string-stability pre-screen for IDM parameter sets.
+
+At a homogeneous equilibrium (gap s, speed v, Δv = v - v_front = 0) the IDM
+partial derivatives are
+    f_s  =  2a s*² / s³
+    f_v  = -a (4v³/v0⁴ + 2 s* T / s²)
+    f_Δv = -a s* v / (sqrt(ab) s²)          with s* = s0 + vT.
+A platoon is string stable iff f_s <= f_v²/2 + f_v f_Δv. Long waves
+(vehicle wavenumber k) evolve as exp((i λ1 k + λ2 k²) t) with
+    λ1 = -f_s / f_v                      (= dv_e/ds, s⁻¹)
+    λ2 = f_s / f_v³ (f_v²/2 + f_v f_Δv - f_s)   (> 0: perturbations grow)
+and travel at c = v - (s + L) λ1 (m/s) in the road frame.
+
+Everything is element-wise NumPy, so grids of thousands of parameter sets
+are evaluated in one call. The perception noise and the additional
+constraints are not part of the linear analysis.
+"""
+import numpy as np
+from fundamental_diagram import equilibrium_gap
+
+
+def equilibrium_derivatives(v, v0, s0, T, a, b):
+    """Equilibrium gap and IDM partial derivatives (s, f_s, f_v, f_Δv) at speed v."""
+    s = equilibrium_gap(v, v0, s0, T)
+    s_star = s0 + v * T
+
+    f_s = 2 * a * s_star ** 2 / s ** 3
+    f_v = -a * (4 * v ** 3 / v0 ** 4 + 2 * s_star * T / s ** 2)
+    f_dv = -a * s_star * v / (np.sqrt(a * b) * s ** 2)
+    return s, f_s, f_v, f_dv
+
+
+def string_stability(v, v0, s0, T, a, b, L):
+    """Stability criterion and long-wave properties at equilibrium speed v (all arguments broadcast)."""
+    s, f_s, f_v, f_dv = equilibrium_derivatives(v, v0, s0, T, a, b)
+
+    margin = f_v ** 2 / 2 + f_v * f_dv - f_s
+    lambda1 = -f_s / f_v
+    lambda2 = f_s / f_v ** 3 * margin
+
+    return {
+        "gap": s,
+        "margin": margin,                     # >= 0: string stable
+        "stable": margin >= 0,
+        "lambda1": lambda1,
+        "lambda2": lambda2,
+        "wave_speed": v - (s + L) * lambda1,  # m/s, negative: upstream
+    }
+
+
+def free_flow_speed(flow, v0, s0, T, L, iterations=50):
+    """
+    Equilibrium speed (m/s) on the free-flow branch for a flow (veh/h); NaN above capacity.
+
+    With time headway h = 3600/flow the equilibrium satisfies v h - L = s_e(v).
+    F(v) = v h - L - s_e(v) is concave: bisect F' for its maximum, then F for
+    the root above it.
+    """
+    h = 3600 / np.asarray(flow, dtype=float)
+    v0, s0, T, L, h = np.broadcast_arrays(v0, s0, T, L, h)
+    v0 = v0.astype(float)
+
+    def residual(v):
+        return v * h - L - equilibrium_gap(v, v0, s0, T)
+
+    def slope(v):
+        r = 1 - (v / v0) ** 4
+        return h - T / np.sqrt(r) - (s0 + v * T) * 2 * v ** 3 / v0 ** 4 / r ** 1.5
+
+    low, high = np.zeros_like(v0), v0 * (1 - 1e-12)
+    for _ in range(iterations):
+        middle = 0.5 * (low + high)
+        rising = slope(middle) > 0
+        low = np.where(rising, middle, low)
+        high = np.where(rising, high, middle)
+    peak = 0.5 * (low + high)
+
+    low, high = peak, v0 * (1 - 1e-12)
+    for _ in range(iterations):
+        middle = 0.5 * (low + high)
+        above = residual(middle) > 0
+        low = np.where(above, middle, low)
+        high = np.where(above, high, middle)
+
+    return np.where(residual(peak) >= 0, 0.5 * (low + high), np.nan)
+
+
+def screen(config, wave_speed_range=(-20, -10), **grid):
+    """
+    Classify parameter sets before simulating them.
+
+    grid maps Config field names to arrays (broadcast against each other),
+    e.g. screen(config, idm_safety_time_headway=T[:, None], idm_acceleration=a[None, :]);
+    fields not given are taken from config. Two operating points are checked:
+    - free flow at the experiment's inflow, which should be stable (otherwise
+      traffic breaks down before reaching the bottleneck)
+    - the queue upstream of the bottleneck, at bottleneck_speed_limit, which
+      should be unstable with a wave speed in wave_speed_range (km/h)
+    """
+    fields = ("speed_limit", "idm_minimum_spacing", "idm_safety_time_headway", "idm_acceleration",
+              "idm_desired_deceleration", "vehicle_length", "bottleneck_speed_limit")
+    unknown = set(grid) - set(fields)
+    if unknown:
+        raise ValueError(f"Cannot screen over: {', '.join(sorted(unknown))}")
+
+    values = np.broadcast_arrays(*(np.asarray(grid.get(name, getattr(config, name)), dtype=float)
+                                   for name in fields))
+    v0, s0, T, a, b, L, v_queue = values
+
+    inflow = 3600 / (config.vehicle_min_interval + config.vehicle_extra_interval)
+    v_free = free_flow_speed(inflow, v0, s0, T, L)
+    free = string_stability(v_free, v0, s0, T, a, b, L)
+    queue = string_stability(v_queue, v0, s0, T, a, b, L)
+
+    wave_speed = queue["wave_speed"] * 3.6
+    low, high = wave_speed_range
+
+    free_stable = free["stable"] & ~np.isnan(v_free)
+    queue_unstable = ~queue["stable"]
+    wave_in_range = (wave_speed >= low) & (wave_speed <= high)
+
+    return {
+        "free_flow_speed": v_free,
+        "free_margin": free["margin"],
+        "queue_margin": queue["margin"],
+        "queue_growth": queue["lambda2"],
+        "wave_speed": wave_speed,          # km/h
+        "free_stable": free_stable,
+        "queue_unstable": queue_unstable,
+        "wave_in_range": wave_in_range,
+        "candidate": free_stable & queue_unstable & wave_in_range,
+    }
+
+
+if __name__ == "__main__":
+    import time
+    from config import Config
+
+    config = Config()
+    T = np.linspace(0.5, 2.0, 16)[:, None, None]
+    a = np.linspace(0.5, 3.0, 26)[None, :, None]
+    b = np.linspace(1.0, 4.0, 16)[None, None, :]
+
+    start = time.perf_counter()
+    result = screen(config, idm_safety_time_headway=T, idm_acceleration=a, idm_desired_deceleration=b)
+    elapsed = time.perf_counter() - start
+
+    total = result["candidate"].size
+    print(f"{total} parameter sets in {elapsed * 1000:.1f} ms ({total / elapsed:,.0f} sets/s)")
+    for name in ("free_stable", "queue_unstable", "wave_in_range", "candidate"):
+        print(f"  {name:<15} {np.count_nonzero(result[name]):>6}")
@@ -0,0 +1,18 @@
+import numpy as np
+
+from config import Config
+from simulator import Simulator
+
+
+def test_free_flow_delay_is_not_negative():
+    config = Config(experiment=1, time_max=301, percentage_influenced_by_bottleneck=0, relative_speed_noise=0,
+                    vehicle_min_interval=20, vehicle_extra_interval=0)
+    sim = Simulator(config, verbose=False)
+    sim.run()
+    table = sim.travel_times.table()
+
+    assert len(table["delay"]) > 5
+    assert np.all(table["delay"] >= 0)
+    assert table["delay"][0] < 1e-6                  # Head vehicle: free road at the speed limit
+    assert np.all(table["delay"] < config.simulation_time_step)
+    assert np.allclose(table["travel_time"], table["exit_time"] - table["entry_time"])
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from archive import Archive, write_archive
+from config import Config
+from simulator import Simulator
+from trajectories import COLUMNS, Trajectories
+
+
+@pytest.fixture(scope="module")
+def archived(tmp_path_factory):
+    config = Config(experiment=3, time_max=301)
+    sim = Simulator(config, verbose=False)
+    sim.run()
+    trajectories = Trajectories.from_vehicles(sim.vehicles, config)
+    path = str(tmp_path_factory.mktemp("archive") / "run.idma")
+    write_archive(path, trajectories, vehicles_per_chunk=16, steps_per_chunk=500)
+    return trajectories, Archive(path)
+
+
+def test_read_round_trips_within_quantization(archived):
+    trajectories, archive = archived
+    decoded = archive.read()
+    assert np.array_equal(decoded.offsets, trajectories.offsets)
+    for name in COLUMNS:
+        assert np.max(np.abs(decoded.columns[name] - trajectories.columns[name])) <= 0.01
+
+
+def test_window_keeps_only_rows_inside(archived):
+    trajectories, archive = archived
+    window = archive.window(100, 150)
+    t = trajectories.columns["t"]
+    assert len(window.columns["t"]) == np.count_nonzero((t >= 100 - 1e-9) & (t <= 150 + 1e-9))
+    assert window.columns["t"].min() >= 100 - 1e-9 and window.columns["t"].max() <= 150 + 1e-9
+
+
+def test_window_without_overlapping_chunks_is_empty(archived):
+    _, archive = archived
+    window = archive.window(5000, 6000)
+    assert len(window) == 0
+    assert all(len(values) == 0 for values in window.columns.values())
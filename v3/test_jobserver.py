@@ -0,0 +1,62 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from jobserver import submit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(results, port, timeout=30):
+    command = [sys.executable, "cli.py", "serve", "--port", str(port), "--workers", "2", "--results", str(results)]
+    process = subprocess.Popen(command, cwd=HERE, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("job server did not start")
+
+
+def _submit(specs, port, timeout):
+    """submit() in a daemon thread; fails instead of hanging the test run."""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(submit(specs, port=port)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert results, f"submit did not return within {timeout} s"
+    return results[0]
+
+
+def test_duplicate_specs_on_a_fresh_server_return(tmp_path):
+    port = _free_port()
+    server = _start_server(tmp_path, port)
+    try:
+        spec = {"seed": 1, "experiment": 3, "overrides": {"time_max": 20}}
+        other = {"seed": 2, "experiment": 3, "overrides": {"time_max": 20}}
+        results = _submit([spec, spec, other, spec], port, timeout=120)
+        assert len(results) == 2
+        assert all(event["event"] == "done" for event in results.values())
+
+        # Duplicates of finished jobs are answered from the results
+        again = _submit([spec, spec], port, timeout=60)
+        assert len(again) == 1 and set(again) < set(results)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
@@ -0,0 +1,51 @@
+import numpy as np
+
+from config import Config
+from network import Link, Merge, Network, corridor
+
+
+def _rows(ids, positions, speeds):
+    n = len(ids)
+    return {"id": ids, "position": positions, "speed": speeds, "acceleration": [0.0] * n, "route": [0.0] * n}
+
+
+def test_link_insert_keeps_downstream_order():
+    link = Link("main", 1000, 30, capacity=4)
+    link.push(_rows([1, 2, 3], [900.0, 500.0, 100.0], [30.0] * 3))
+    link.insert(2, _rows([9], [300.0], [20.0]))
+    assert link.column("id").tolist() == [1, 2, 9, 3]
+    assert link.column("position").tolist() == [900.0, 500.0, 300.0, 100.0]
+
+
+def test_merged_vehicle_leads_the_main_vehicles_behind_it():
+    config = Config(experiment=2)
+    main, ramp, out = Link("main", 1000, 30), Link("ramp", 300, 15), Link("out", 1000, 30)
+    merge = Merge(main, ramp, out, lane_length=200)
+    network = Network(config, [main, ramp, out], [merge])
+
+    # A wide gap between main vehicles 1 and 2, alongside the ramp vehicle 100 m before the node
+    main.push(_rows([1, 2], [990.0, 700.0], [25.0, 25.0]))
+    ramp.push(_rows([3], [200.0], [25.0]))
+    merge.decide(network)
+
+    assert merge.merges == 1 and len(ramp) == 0
+    assert main.column("id").tolist() == [1, 3, 2]
+    assert main.column("position")[1] == 900.0
+
+
+def test_ramp_demand_is_served():
+    config = Config(experiment=2)
+    network = corridor(config, segments=8)
+    ramps = [node for node in network.nodes if isinstance(node, Merge)]
+
+    min_gap = np.inf
+    for i in range(int(600 / network.dt) + 1):
+        network.step(1 + i * network.dt)
+        for link in network.links:
+            x = link.column("position")
+            if len(x) > 1:
+                min_gap = min(min_gap, np.min(x[:-1] - x[1:] - network.L))
+
+    assert sum(node.merges for node in ramps) > 10 * len(ramps)
+    assert network.ramp_queue() <= len(ramps)
+    assert min_gap >= network.s0 / 2
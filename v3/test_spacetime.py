@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from config import Config
+from simulator import Simulator
+from spacetime import SpaceTimeIndex
+from trajectories import Trajectories
+
+
+@pytest.fixture(scope="module")
+def index():
+    config = Config(experiment=3, time_max=301)
+    sim = Simulator(config, verbose=False)
+    sim.run()
+    return SpaceTimeIndex.build(Trajectories.from_vehicles(sim.vehicles, config))
+
+
+def _brute_force_window(index, x_min, x_max, t_min, t_max):
+    columns = index.trajectories.columns
+    x, t = columns["position"], columns["t"]
+    inside = (x >= x_min) & (x <= x_max) & (x < index.road_length) & (t >= t_min - 1e-9) & (t <= t_max + 1e-9)
+    return np.unique(index.vehicle_of(np.flatnonzero(inside)))
+
+
+def test_window_matches_brute_force(index):
+    for window in [(100, 600, 50, 120), (0, index.road_length, 200, 200.5), (1500, 1900, 1, 300)]:
+        assert np.array_equal(index.window(*window), _brute_force_window(index, *window))
+
+
+@pytest.mark.parametrize("window", [
+    (2050, 2300, 100, 200),     # beyond the end of the road
+    (-50, -10, 100, 200),       # before its start
+    (600, 100, 100, 200),       # inverted positions
+    (100, 600, 200, 100),       # inverted times
+])
+def test_window_off_the_road_or_inverted_is_empty(index, window):
+    assert index.window(*window).size == 0
+    rows = index.window(*window, rows=True)
+    assert rows.size == 0 and rows.dtype.kind == "i"
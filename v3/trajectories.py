@@ -0,0 +1,78 @@
+import json
+import numpy as np
+
+
+COLUMNS = ("t", "position", "speed", "acceleration")
+
+
+def config_fields(config):
+    """Plain (JSON-serializable) fields of a Config, for storing alongside results."""
+    return {name: value for name, value in vars(config).items()
+            if isinstance(value, (int, float, str, bool))}
+
+
+class Trajectories:
+    """
+    Columnar trajectories of all vehicles.
+
+    - Rows are sorted by vehicle, then time; vehicle k occupies rows
+      offsets[k]:offsets[k + 1] and has id vehicle_ids[k].
+    - Columns: t, position, speed, acceleration (float64).
+    - metadata holds the config fields of the run.
+    """
+
+    def __init__(self, vehicle_ids, offsets, columns, metadata=None):
+        self.vehicle_ids = vehicle_ids
+        self.offsets = offsets
+        self.columns = columns
+        self.metadata = metadata or {}
+
+
+    @classmethod
+    def from_vehicles(cls, vehicles, config=None):
+        """Build from objects with .id and .history (Vehicle, VehicleRecord)."""
+        vehicle_ids = np.array([vehicle.id for vehicle in vehicles], dtype=np.int64)
+        lengths = np.array([len(vehicle.history) for vehicle in vehicles], dtype=np.int64)
+        offsets = np.zeros(len(vehicles) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        columns = {}
+        for name in COLUMNS:
+            columns[name] = np.fromiter(
+                (record[name] for vehicle in vehicles for record in vehicle.history),
+                dtype=np.float64, count=int(offsets[-1])
+            )
+
+        metadata = config_fields(config) if config is not None else {}
+        return cls(vehicle_ids, offsets, columns, metadata)
+
+
+    @classmethod
+    def load(cls, path):
+        """Load trajectories saved with save()."""
+        with np.load(path) as data:
+            columns = {name: data[name] for name in COLUMNS}
+            metadata = json.loads(str(data["metadata"]))
+            return cls(data["vehicle_ids"], data["offsets"], columns, metadata)
+
+
+    def save(self, path):
+        """Save as an (uncompressed) .npz file."""
+        np.savez(path, vehicle_ids=self.vehicle_ids, offsets=self.offsets,
+                 metadata=np.array(json.dumps(self.metadata)), **self.columns)
+
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+
+    def vehicle(self, k):
+        """Columns of the k-th vehicle (views)."""
+        start, end = self.offsets[k], self.offsets[k + 1]
+        return {name: column[start:end] for name, column in self.columns.items()}
+
+
+    def iter_vehicles(self):
+        """Yield (vehicle id, columns) for every vehicle."""
+        for k, vehicle_id in enumerate(self.vehicle_ids):
+            yield int(vehicle_id), self.vehicle(k)
@@ -0,0 +1,201 @@
+"""
+Result transport for worker processes.
+
+A worker writes the trajectories of a finished run into one shared memory
+block (or a memory-mapped file) and returns a small ResultDescriptor with the
+block name, the sizes and the summary metrics. The parent attaches zero-copy
+NumPy views, so nothing but the descriptor is pickled between processes.
+
+Block layout (8-byte items):
+    vehicle_ids  int64   [n]
+    offsets      int64   [n + 1]
+    t, position, speed, acceleration  float64 [m] each
+"""
+import os
+import uuid
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from trajectories import COLUMNS, Trajectories, config_fields
+
+
+class ResultDescriptor:
+    """Small, picklable handle of a result written by a worker."""
+
+    def __init__(self, backend, name, num_vehicles, num_rows, metrics, metadata):
+        self.backend = backend            # "shm" or "mmap"
+        self.name = name                  # shared memory name or file path
+        self.num_vehicles = num_vehicles
+        self.num_rows = num_rows
+        self.metrics = metrics
+        self.metadata = metadata
+
+
+    @property
+    def size(self):
+        return 8 * (2 * self.num_vehicles + 1 + len(COLUMNS) * self.num_rows)
+
+
+def _layout(buffer, num_vehicles, num_rows):
+    """NumPy views of the blocks in a result buffer."""
+    vehicle_ids = np.ndarray((num_vehicles,), dtype=np.int64, buffer=buffer)
+    offsets = np.ndarray((num_vehicles + 1,), dtype=np.int64, buffer=buffer, offset=8 * num_vehicles)
+
+    columns = {}
+    offset = 8 * (2 * num_vehicles + 1)
+    for name in COLUMNS:
+        columns[name] = np.ndarray((num_rows,), dtype=np.float64, buffer=buffer, offset=offset)
+        offset += 8 * num_rows
+
+    return vehicle_ids, offsets, columns
+
+
+# ===== Worker side =====
+def export_result(vehicles, config, metrics=None, backend="shm", directory=None):
+    """
+    Write the trajectories of vehicles (with .id and .history) into a new block.
+
+    - backend "shm": multiprocessing.shared_memory block; the parent must release it.
+    - backend "mmap": file in directory (default: the temp directory).
+    """
+    num_vehicles = len(vehicles)
+    lengths = [len(vehicle.history) for vehicle in vehicles]
+    num_rows = sum(lengths)
+
+    descriptor = ResultDescriptor(backend, None, num_vehicles, num_rows,
+                                  metrics or {}, config_fields(config))
+    size = max(descriptor.size, 1)
+
+    if backend == "shm":
+        block = shared_memory.SharedMemory(create=True, size=size)
+        descriptor.name = block.name
+
+        # Ownership passes to the parent: keep this process's resource
+        # tracker from unlinking the block when the worker exits
+        resource_tracker.unregister(block._name, "shared_memory")
+        buffer = block.buf
+    elif backend == "mmap":
+        directory = directory or os.environ.get("TMPDIR", "/tmp")
+        descriptor.name = os.path.join(directory, f"idm_result_{uuid.uuid4().hex}.bin")
+        buffer = np.memmap(descriptor.name, dtype=np.uint8, mode="w+", shape=(size,))
+    else:
+        raise ValueError(f"Unknown backend: {backend!r}")
+
+    vehicle_ids, offsets, columns = _layout(buffer, num_vehicles, num_rows)
+    vehicle_ids[:] = [vehicle.id for vehicle in vehicles]
+    offsets[0] = 0
+    np.cumsum(lengths, out=offsets[1:])
+
+    for k, vehicle in enumerate(vehicles):
+        start, end = offsets[k], offsets[k + 1]
+        for name in COLUMNS:
+            columns[name][start:end] = [record[name] for record in vehicle.history]
+
+    # Drop the views before closing the block
+    del vehicle_ids, offsets, columns
+    if backend == "shm":
+        block.close()
+    else:
+        buffer.flush()
+        del buffer
+
+    return descriptor
+
+
+# ===== Parent side =====
+class SharedResult:
+    """Result attached in the parent: zero-copy Trajectories plus metrics; release() frees the block."""
+
+    def __init__(self, descriptor: ResultDescriptor):
+        self.descriptor = descriptor
+        self.metrics = descriptor.metrics
+
+        if descriptor.backend == "shm":
+            self._block = shared_memory.SharedMemory(name=descriptor.name)
+            buffer = self._block.buf
+        else:
+            self._block = None
+            buffer = np.memmap(descriptor.name, dtype=np.uint8, mode="r",
+                               shape=(max(descriptor.size, 1),))
+
+        vehicle_ids, offsets, columns = _layout(buffer, descriptor.num_vehicles, descriptor.num_rows)
+        self.trajectories = Trajectories(vehicle_ids, offsets, columns, descriptor.metadata)
+
+
+    def release(self):
+        """Free the block; arrays still referenced elsewhere keep the mapping alive until dropped."""
+        self.trajectories = None
+        if self._block is not None:
+            try:
+                self._block.close()
+            except BufferError:
+                pass
+            self._block.unlink()
+            self._block = None
+        elif os.path.exists(self.descriptor.name):
+            os.remove(self.descriptor.name)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def simulate_to_shared(task, backend="shm"):
+    """Worker function: run (seed, experiment, overrides) and export the result."""
+    from config import Config
+    from simulator import Simulator
+
+    seed, experiment, overrides = task
+    config = Config(seed, experiment, **overrides)
+    sim = Simulator(config, verbose=False)
+    sim.run()
+
+    metrics = {
+        "seed": seed,
+        "experiment": experiment,
+        "vehicles": len(sim.vehicles),
+        "inflow_rate": sim.inflow_rate,
+    }
+    return export_result(sim.vehicles, config, metrics, backend)
+
+
+def imap_results(tasks, processes=None, backend="shm", worker=simulate_to_shared):
+    """
+    Run tasks in a process pool and yield a SharedResult per finished run
+    (in completion order). The caller releases each result when done with it.
+
+    At most `processes` tasks are in flight, so finished results waiting to
+    be consumed never hold more than that many blocks. When the generator is
+    closed early (or a task fails), pending tasks are cancelled and the
+    blocks of results that were never yielded are freed.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from functools import partial
+    from itertools import islice
+
+    processes = processes or os.cpu_count()
+    tasks = iter(tasks)
+    run = partial(worker, backend=backend)
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pending = {pool.submit(run, task) for task in islice(tasks, processes)}
+        finished = set()
+        try:
+            while pending or finished:
+                if not finished:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                future = finished.pop()
+                pending.update(pool.submit(run, task) for task in islice(tasks, 1))
+                yield SharedResult(future.result())
+        finally:
+            for future in pending | finished:
+                if future.cancel():
+                    continue
+                try:
+                    descriptor = future.result()
+                except Exception:
+                    continue
+                SharedResult(descriptor).release()
@@ -1,43 +1,159 @@
 import random
 
+INTEGRATION_SCHEMES = ("euler", "ballistic", "trapezoidal", "rk4")
+
+
+def idm_acceleration(s, v, v_front, v0, noise, s0, T, a_max, b_desired):
+    """IDM acceleration for net gap s, speed v and leader speed v_front (with constraints)."""
+    v_delta = v - v_front  # relative speed
+    v_delta_perceived = v_delta + noise
+
+    s = max(s, 0.1)  # [additional constraint]
+
+    # Desired dynamical gap s*
+    term1 = T * v
+    term2 = v * v_delta_perceived / (2 * (a_max * b_desired) ** 0.5)
+    s_star = s0 + max(0, term1 + term2)
+
+    # IDM acceleration formula
+    term1 = (v / v0) ** 4
+    term2 = (s_star / s) ** 2
+    a = a_max * (1 - term1 - term2)
+
+    # [additional constraint]
+    if a < -b_desired:
+        a = -b_desired
+    if a > a_max:
+        a = a_max
+
+    return a
+
+
+def next_speed(position, speed, dv, front_position, road_length, L, delta_t):
+    """Speed after increment dv with the exit rule and safety constraints (front_position None for the head)."""
+
+    # Vehicle has left the road
+    if position >= road_length:
+        return 30
+
+    v_new = speed + dv
+
+    # Additional constraint: do not exceed max speed allowed by gap
+    if front_position is not None:
+        s = front_position - position - L
+        s = max(s, 0.01)  # [additional constraint]
+        v_max_allowed = s / delta_t
+        v_new = min(v_new, v_max_allowed)
+
+    # Prevent negative speeds
+    return max(v_new, 0)  # [additional constraint]
+
+
+def displacement(scheme, v_old, v_new, a, delta_t):
+    """Distance travelled in one step for the given integration scheme (v_old/v_new: speed before/after)."""
+    if scheme == "euler":
+        # d = v*dt + 0.5*a*dt^2, with the already-updated speed v
+        d = v_new * delta_t + 0.5 * a * delta_t ** 2
+
+    elif scheme == "ballistic":
+        # d = v_old*dt + 0.5*a*dt^2, or the stopping distance if the vehicle halts within the step
+        if a < 0 and v_old + a * delta_t < 0:
+            d = -0.5 * v_old * v_old / a
+        else:
+            d = v_old * delta_t + 0.5 * a * delta_t ** 2
+
+    elif scheme == "trapezoidal":
+        # d = 0.5*(v_old + v_new)*dt, consistent with the constrained speed
+        d = 0.5 * (v_old + v_new) * delta_t
+
+    else:
+        raise ValueError(f"Unknown integration scheme: {scheme!r}")
+
+    return max(d, 0)   # [additional constraint]
+
+
+class VehicleParameters:
+    """Constants shared by all vehicles of a run (road, bottleneck, IDM); immutable."""
+
+    __slots__ = (
+        "road_length", "speed_limit",
+        "bottleneck_x_start", "bottleneck_x_end", "bottleneck_t_start", "bottleneck_t_end",
+        "bottleneck_speed_limit",
+        "s0", "T", "a_max", "b_desired", "tau", "L", "delta_t",
+        "integration_scheme", "relative_speed_noise",
+    )
+
+    def __init__(self, config):
+        values = {
+            # Road
+            "road_length": config.road_length,
+            "speed_limit": config.speed_limit,
+
+            # Bottleneck
+            "bottleneck_x_start":     config.bottleneck_x_start,
+            "bottleneck_x_end":       config.bottleneck_x_end,
+            "bottleneck_t_start":     config.bottleneck_t_start,
+            "bottleneck_t_end":       config.bottleneck_t_end,
+            "bottleneck_speed_limit": config.bottleneck_speed_limit,
+
+            # IDM
+            "s0":        config.idm_minimum_spacing,
+            "T":         config.idm_safety_time_headway,
+            "a_max":     config.idm_acceleration,
+            "b_desired": config.idm_desired_deceleration,
+            "tau":       config.idm_delay,
+            "L":         config.vehicle_length,
+            "delta_t":   config.simulation_time_step,
+
+            # Integration and perception noise
+            "integration_scheme":   config.integration_scheme,
+            "relative_speed_noise": config.relative_speed_noise,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VehicleParameters is immutable")
+
+
 class Vehicle:
+    """Per-vehicle mutable state; constants live in the shared VehicleParameters."""
+
+    __slots__ = (
+        "id", "position", "speed", "speed_previous", "a", "v0", "noise",
+        "vehicle_front", "influenced_by_bottleneck", "history", "params",
+        "v0_cap", "a_cap",
+    )
 
-    def __init__(self, config, id, vehicle_front=None):
-        self.id = id        
+    def __init__(self, config, id, vehicle_front=None, params=None):
+        self.id = id
         self.position = 0
         self.vehicle_front = vehicle_front
 
-        # Road and vehicle initialization
-        self.road_length = config.road_length
-        self.speed_limit = config.speed_limit
-        self.speed       = config.initial_speed
-        self.history     = []
-
-        # Bottleneck parameters
-        self.bottleneck_x_start     = config.bottleneck_x_start
-        self.bottleneck_x_end       = config.bottleneck_x_end
-        self.bottleneck_t_start     = config.bottleneck_t_start
-        self.bottleneck_t_end       = config.bottleneck_t_end
-        self.bottleneck_speed_limit = config.bottleneck_speed_limit        
-
-        # IDM parameters
-        self.v0         = self.speed
-        self.s0         = config.idm_minimum_spacing
-        self.T          = config.idm_safety_time_headway
-        self.a_max      = config.idm_acceleration
-        self.b_desired  = config.idm_desired_deceleration
-        self.tau        = config.idm_delay
-        self.L          = config.vehicle_length
-        self.delta_t    = config.simulation_time_step
-        self.a          = config.initial_acceleration
-
-        # Noise in relative speed perception
-        self.relative_speed_noise = config.relative_speed_noise
+        # Shared constants (pass one instance for all vehicles of a run)
+        if params is None:
+            params = VehicleParameters(config)
+        self.params = params
+
+        # Vehicle initialization
+        self.speed          = config.initial_speed
+        self.speed_previous = self.speed
+        self.v0             = self.speed
+        self.a              = config.initial_acceleration
+        self.history        = []
+
+        # Last noise sample in relative speed perception (kept for RK4 stages)
+        self.noise = 0
+
+        # Controller caps on desired speed and acceleration (None: uncontrolled)
+        self.v0_cap = None
+        self.a_cap  = None
 
         # Whether this vehicle reacts to bottleneck limits
         if random.random() < config.percentage_influenced_by_bottleneck:
             self.influenced_by_bottleneck = True
-        else: 
+        else:
             self.influenced_by_bottleneck = False
 
 
@@ -45,101 +161,110 @@ class Vehicle:
         """Apply bottleneck speed limit if vehicle is inside spatial and temporal bottleneck."""
         if not self.influenced_by_bottleneck:
             return
-        
-        in_x_range = (self.position >= self.bottleneck_x_start and 
-                      self.position <= self.bottleneck_x_end)
-        in_t_range = (current_time >= self.bottleneck_t_start and
-                      current_time <= self.bottleneck_t_end)
+
+        p = self.params
+        in_x_range = (self.position >= p.bottleneck_x_start and
+                      self.position <= p.bottleneck_x_end)
+        in_t_range = (current_time >= p.bottleneck_t_start and
+                      current_time <= p.bottleneck_t_end)
 
         if in_x_range and in_t_range:
-            self.v0 = self.bottleneck_speed_limit
+            self.v0 = p.bottleneck_speed_limit
         else:
-            self.v0 = self.speed_limit
+            self.v0 = p.speed_limit
 
 
 
     # ===== Update-1: Acceleration =====
     def update_acceleration(self):
         """Compute IDM acceleration with additional constraints."""
+        p = self.params
+
+        # Noise in perceived relative speed (without noise, leave the random
+        # stream to the inflow and bottleneck draws)
+        sigma = p.relative_speed_noise
+        self.noise = random.gauss(0, sigma) if sigma != 0 else 0
 
         # Handle case with no front vehicle
-        if self.vehicle_front is None:
-            v_front_speed    = self.speed_limit
-            v_front_position = self.position + 1e6  # effectively infinite headway
+        front = self.vehicle_front
+        if front is None:
+            v_front_speed = p.speed_limit
+            s = self.position + 1e6 - self.position - p.L  # effectively infinite headway
         else:
-            v_front_speed    = self.vehicle_front.speed
-            v_front_position = self.vehicle_front.position
+            v_front_speed = front.speed
+            s = front.position - self.position - p.L
+
+        self.a = self._controlled_acceleration(s, self.speed, v_front_speed)
 
-        v = self.speed
-        v_delta = v - v_front_speed  # relative speed
-        v_delta_perceived = self._perceptive_relative_speed(v_delta)
+
+    def acceleration_at(self, position, speed, front_position=None, front_speed=None):
+        """IDM acceleration for a given own state, using the current perception noise sample."""
+        p = self.params
+
+        # Handle case with no front vehicle
+        if self.vehicle_front is None:
+            front_speed    = p.speed_limit
+            front_position = position + 1e6  # effectively infinite headway
+        elif front_position is None:
+            front_speed    = self.vehicle_front.speed
+            front_position = self.vehicle_front.position
 
         # Net distance gap
-        s = v_front_position - self.position - self.L
-        s = max(s, 0.1)  # [additional constraint]
-
-        # IDM parameters
-        s0 = self.s0
-        a_max = self.a_max
-        b_desired = self.b_desired
-
-        # Desired dynamical gap s*
-        term1 = self.T * v
-        term2 = v * v_delta_perceived / (2 * (a_max * b_desired) ** 0.5)
-        s_star = s0 + max(0, term1 + term2)
-
-        # IDM acceleration formula
-        term1 = (v / self.v0) ** 4
-        term2 = (s_star / s) ** 2
-        a = a_max * (1 - term1 - term2)
-
-        # [additional constraint]
-        if a < -b_desired:
-            a = -b_desired
-        if a > a_max:
-            a = a_max
-
-        self.a = a
-        
-
-
-    def update_speed(self):
-        """Update vehicle speed using IDM acceleration and additional safety constraints."""
-        
-        # Vehicle has left the road
-        if self.position >= self.road_length:
-            v_new = 30
-        else:
-            a = self.a
-            v = self.speed
-            delta_t = self.delta_t
+        s = front_position - position - p.L
 
-            # Standard Euler update
-            v_new = v + a * delta_t
+        return self._controlled_acceleration(s, speed, front_speed)
 
-            # Additional constraint: do not exceed max speed allowed by gap
-            if self.vehicle_front is not None:
-                s = self.vehicle_front.position - self.position - self.L
-                s = max(s, 0.01)  # [additional constraint]
-                v_max_allowed = s / delta_t
-                v_new = min(v_new, v_max_allowed)
 
-            # Prevent negative speeds
-            v_new = max(v_new, 0)  # [additional constraint]
+    def _controlled_acceleration(self, s, speed, front_speed):
+        """IDM acceleration with the controller caps applied."""
+        p = self.params
+        v0 = self.v0
+        if self.v0_cap is not None and self.v0_cap < v0:
+            v0 = self.v0_cap
 
-        self.speed = v_new  
+        a = idm_acceleration(s, speed, front_speed, v0, self.noise,
+                             p.s0, p.T, p.a_max, p.b_desired)
 
+        if self.a_cap is not None and a > self.a_cap:
+            a = self.a_cap
+        return a
 
-    # ===== Update-3: Position =====
-    def update_position(self):
-        """Update vehicle position with kinematic equation and constraints."""
-        v = self.speed
-        a = self.a
-        delta_t = self.delta_t
 
-        # d = v*dt + 0.5*a*dt^2
-        d = v * delta_t + 0.5 * a * delta_t ** 2
-        d = max(d, 0)   # [additional constraint]
+
+    # ===== Update-2: Speed =====
+    def update_speed(self, dv=None):
+        """Update vehicle speed using IDM acceleration and additional safety constraints.
+
+        dv overrides the Euler increment a*dt (used by the RK4 scheme).
+        """
+        p = self.params
+        self.speed_previous = self.speed
+
+        # Standard Euler update
+        if dv is None:
+            dv = self.a * p.delta_t
+
+        if self.vehicle_front is None:
+            front_position = None
+        else:
+            front_position = self.vehicle_front.position
+
+        self.speed = next_speed(self.position, self.speed, dv, front_position,
+                                p.road_length, p.L, p.delta_t)
+
+
+    # ===== Update-3: Position =====
+    def update_position(self, dx=None):
+        """Update vehicle position with the configured integration scheme and constraints.
+
+        dx overrides the scheme's displacement (used by the RK4 scheme).
+        """
+        if dx is None:
+            p = self.params
+            d = displacement(p.integration_scheme, self.speed_previous, self.speed,
+                             self.a, p.delta_t)
+        else:
+            d = max(dx, 0)   # [additional constraint]
 
         self.position = self.position + d
 
@@ -153,9 +278,3 @@ class Vehicle:
             "speed": self.speed,
             "acceleration": self.a
         })
-
-
-    def _perceptive_relative_speed(self, v_delta):
-        """Add noise to perceived relative speed."""
-        noise = random.gauss(0, self.relative_speed_noise)
-        return v_delta + noise
\ No newline at end of file